@@ -0,0 +1,142 @@
+"""Cost-based admission control for analysis requests.
+
+Every request gets a cost estimate before any work starts. Cheap ones
+(tweets, short reviews) go to the fast lane. Expensive ones (long
+documents, big uploads) go to the large lane, which has its own, smaller
+concurrency limit. A 15 MB PDF therefore waits behind other large
+documents, not in front of short texts. Each lane has a bounded queue;
+when it is full, or a slot doesn't free up within max_wait seconds, the
+request is rejected with a Retry-After estimate instead of piling up.
+"""
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-sentence overhead in characters: each sentence costs a transformer call on top of its length
+SENTENCE_COST = 200
+_SENTENCE_END = re.compile(r'[.!?]+(?:\s|$)|\n')
+
+
+def estimate_cost(text):
+    """Estimated cost of analyzing text: its length plus a fixed overhead per sentence."""
+    return len(text) + SENTENCE_COST * max(1, len(_SENTENCE_END.findall(text)))
+
+
+class Rejected(Exception):
+    def __init__(self, lane, retry_after, reason):
+        super().__init__(reason)
+        self.lane = lane
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Lane:
+    """A concurrency limit with a bounded, time-limited wait queue."""
+
+    def __init__(self, name, concurrency, queue_size, max_wait):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of how long admitted work holds a slot, for Retry-After
+        self.average_seconds = 1.0
+        self._condition = threading.Condition()
+
+    def retry_after(self):
+        waves = (self.queued + 1) / max(self.concurrency, 1)
+        return max(1, math.ceil(waves * self.average_seconds))
+
+    def check(self):
+        """Reject now if the queue is already full, without taking a slot."""
+        with self._condition:
+            if self.active >= self.concurrency and self.queued >= self.queue_size:
+                self.rejected += 1
+                raise Rejected(self.name, self.retry_after(), f'The {self.name} lane is full')
+
+    def acquire(self):
+        with self._condition:
+            if self.active >= self.concurrency:
+                if self.queued >= self.queue_size:
+                    self.rejected += 1
+                    raise Rejected(self.name, self.retry_after(), f'The {self.name} lane is full')
+                self.queued += 1
+                try:
+                    admitted = self._condition.wait_for(lambda: self.active < self.concurrency, timeout=self.max_wait)
+                finally:
+                    self.queued -= 1
+                if not admitted:
+                    self.rejected += 1
+                    raise Rejected(self.name, self.retry_after(), f'Timed out waiting in the {self.name} lane')
+            self.active += 1
+            self.admitted += 1
+        return time.perf_counter()
+
+    def release(self, started):
+        elapsed = time.perf_counter() - started
+        with self._condition:
+            self.active -= 1
+            self.average_seconds = 0.9 * self.average_seconds + 0.1 * elapsed
+            self._condition.notify()
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'queued': self.queued,
+            'concurrency': self.concurrency,
+            'queue_size': self.queue_size,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'average_seconds': self.average_seconds
+        }
+
+
+class Ticket:
+    """A held lane slot; release it exactly once when the work is done."""
+
+    def __init__(self, lane, started):
+        self.lane = lane
+        self._started = started
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.lane.release(self._started)
+
+
+class AdmissionController:
+    def __init__(self, large_cost=20000, fast_concurrency=8, fast_queue=64,
+                 large_concurrency=1, large_queue=2, max_wait=10.0):
+        self.large_cost = large_cost
+        self.lanes = {
+            'fast': Lane('fast', fast_concurrency, fast_queue, max_wait),
+            'large': Lane('large', large_concurrency, large_queue, max_wait),
+        }
+
+    def lane_for(self, cost):
+        return self.lanes['large' if cost > self.large_cost else 'fast']
+
+    def acquire(self, cost):
+        """Wait for a slot in the lane for cost; raises Rejected when over capacity."""
+        lane = self.lane_for(cost)
+        return Ticket(lane, lane.acquire())
+
+    @contextmanager
+    def admit(self, cost):
+        ticket = self.acquire(cost)
+        try:
+            yield ticket.lane
+        finally:
+            ticket.release()
+
+    def stats(self):
+        return {
+            'large_cost': self.large_cost,
+            'lanes': {name: lane.stats() for name, lane in self.lanes.items()}
+        }
@@ -1,324 +1,672 @@
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file, Response, stream_with_context, g
 import os
+import logging
 from werkzeug.utils import secure_filename
-from docx import Document
-from PyPDF2 import PdfReader
-from sentiment_model import SentimentAnalyzer
-import pandas as pd
+import codecs
 import json
+import itertools
+import importlib
+import threading
+import time
 from datetime import datetime
+from functools import wraps
 import io
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from io import BytesIO
-import matplotlib.pyplot as plt
-import base64
 from flask_cors import CORS
+from exports import create_analysis_csv, render_pdf, iter_analysis_csv, iter_analyses_csv, RenderBusy
+from cache import ResultStore
+from phrases import PhraseAggregator
+from admission import AdmissionController, Rejected, estimate_cost
+from metrics import registry, collect_timings, timed_iter, REQUEST_SECONDS, INPUT_BYTES, INPUT_CHARS, ERRORS
+
+# Upload dependencies (python-docx, PyPDF2), like the export ones in exports.py, are
+# imported inside the functions that use them so they don't slow down startup
+
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
 ALLOWED_EXTENSIONS = {'txt', 'doc', 'docx', 'pdf'}
 
-# Ensure upload folder exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Recent results, so exports can be downloaded by ID instead of posting the result back
+result_store = ResultStore(
+    maxsize=int(os.environ.get('RESULT_STORE_SIZE', 256)),
+    ttl=float(os.environ.get('RESULT_STORE_TTL', 3600))
+)
 
-analyzer = SentimentAnalyzer()
+def phrase_keys(phrases):
+    return analyzer.phrase_keys(phrases)
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Top key phrases across everything analyzed since startup, in fixed memory
+phrase_stats = PhraseAggregator(
+    capacity=int(os.environ.get('PHRASE_STATS_CAPACITY', 1000)),
+    normalize=phrase_keys
+)
 
-def extract_text_from_file(file):
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(filepath)
-    
+# Short texts and large documents wait in separate lanes, so big uploads can't starve tweets
+admission = AdmissionController(
+    large_cost=int(os.environ.get('ADMISSION_LARGE_COST', 20000)),
+    fast_concurrency=int(os.environ.get('ADMISSION_FAST_CONCURRENCY', 8)),
+    fast_queue=int(os.environ.get('ADMISSION_FAST_QUEUE', 64)),
+    large_concurrency=int(os.environ.get('ADMISSION_LARGE_CONCURRENCY', 1)),
+    large_queue=int(os.environ.get('ADMISSION_LARGE_QUEUE', 2)),
+    max_wait=float(os.environ.get('ADMISSION_MAX_WAIT', 10))
+)
+
+# The analyzer is built by a background warm-up thread; /readyz reports when it can take traffic
+analyzer = None
+analyzer_ready = threading.Event()
+analyzer_error = None
+
+# Heavy modules imported (and timed) by the warm-up thread before the analyzer is built
+WARMUP_IMPORTS = ['torch', 'transformers', 'spacy', 'textblob']
+
+def load_analyzer():
+    """Import the model stack, build the analyzer and run one dummy inference."""
+    global analyzer, analyzer_error
+    timings = {}
     try:
-        if filename.endswith('.txt'):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                text = f.read()
-        elif filename.endswith('.docx'):
-            doc = Document(filepath)
-            text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-        elif filename.endswith('.pdf'):
-            reader = PdfReader(filepath)
-            text = ''
-            for page in reader.pages:
-                text += page.extract_text() + '\n'
-        else:
-            raise ValueError('Unsupported file format')
-            
-        return text.strip()
+        for module in WARMUP_IMPORTS:
+            start = time.perf_counter()
+            importlib.import_module(module)
+            timings[f'import {module}'] = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        from sentiment_model import SentimentAnalyzer
+        loaded = SentimentAnalyzer(
+            cache_size=int(os.environ.get('SENTIMENT_CACHE_SIZE', 1024)),
+            cache_path=os.environ.get('SENTIMENT_CACHE_PATH'),
+            backend=os.environ.get('SENTIMENT_BACKEND', 'torch'),
+            micro_batch_wait_ms=float(os.environ['SENTIMENT_MICRO_BATCH_WAIT_MS']) if 'SENTIMENT_MICRO_BATCH_WAIT_MS' in os.environ else None,
+            near_duplicates=os.environ.get('SENTIMENT_NEAR_DUPLICATES', '').lower() in ('1', 'true', 'yes'),
+            near_duplicate_threshold=float(os.environ.get('SENTIMENT_NEAR_DUPLICATE_THRESHOLD', 0.8)),
+            lexicon_dir=os.environ.get('SENTIMENT_LEXICON_DIR'),
+            lexicon_index_dir=os.environ.get('SENTIMENT_LEXICON_INDEX_DIR'),
+            lexicon_reload_interval=float(os.environ.get('SENTIMENT_LEXICON_RELOAD_SECONDS', 5)),
+            cascade_threshold=float(os.environ['SENTIMENT_CASCADE_THRESHOLD']) if 'SENTIMENT_CASCADE_THRESHOLD' in os.environ else None
+        )
+        timings['model load'] = time.perf_counter() - start
+        
+        # Run every stage once so the first real request doesn't pay for lazy initialization
+        start = time.perf_counter()
+        loaded.analyze("Warm-up run: I am really happy the models are loaded.")
+        timings['warm-up inference'] = time.perf_counter() - start
+        
+        analyzer = loaded
+        analyzer_ready.set()
+    except Exception as e:
+        analyzer_error = str(e)
+        logger.exception("Model warm-up failed: %s", e)
     finally:
-        # Clean up uploaded file
-        if os.path.exists(filepath):
-            os.remove(filepath)
-
-def create_analysis_csv(result):
-    """Convert analysis result to CSV format"""
-    # Create DataFrames for different aspects of the analysis
-    main_df = pd.DataFrame({
-        'Metric': ['Sentiment', 'Polarity'],
-        'Value': [
-            result.get('sentiment', 'N/A'),
-            result.get('polarity', 0)
-        ]
-    })
-    
-    # Handle emotions data with metadata
-    emotions = result.get('emotions', {})
-    emotions_df = pd.DataFrame([
-        {
-            'Emotion': emotion,
-            'Score': data['score'],
-            'Description': data['description']
-        }
-        for emotion, data in emotions.items()
-    ]) if emotions else pd.DataFrame(columns=['Emotion', 'Score', 'Description'])
-    
-    # Sort emotions by score
-    if not emotions_df.empty:
-        emotions_df = emotions_df.sort_values('Score', ascending=False)
-    
-    # Handle key phrases data
-    key_phrases = result.get('key_phrases', [])
-    key_phrases_df = pd.DataFrame({'Phrase': key_phrases}) if key_phrases else pd.DataFrame(columns=['Phrase'])
-    
-    # Handle sentence analysis data
-    sentence_analysis = result.get('sentence_analysis', [])
-    if sentence_analysis:
-        sentences_df = pd.DataFrame([{
-            'Text': s.get('text', ''),
-            'Sentiment': s.get('sentiment', ''),
-            'Confidence': s.get('confidence', 0)
-        } for s in sentence_analysis])
-    else:
-        sentences_df = pd.DataFrame(columns=['Text', 'Sentiment', 'Confidence'])
-    
-    # Create a buffer for the CSV file
-    output = io.StringIO()
-    
-    # Write each section to the CSV with headers
-    output.write("MAIN METRICS\n")
-    main_df.to_csv(output, index=False)
-    output.write("\n\nEMOTIONS\n")
-    emotions_df.to_csv(output, index=False)
-    output.write("\n\nKEY PHRASES\n")
-    key_phrases_df.to_csv(output, index=False)
-    output.write("\n\nSENTENCE ANALYSIS\n")
-    sentences_df.to_csv(output, index=False)
-    
-    return output.getvalue()
-
-def create_emotion_chart_image(emotions):
-    """Create a pie chart for emotions and return it as a BytesIO object."""
-    plt.figure(figsize=(6, 6))
-    plt.pie(
-        [data['score'] for data in emotions.values()],
-        labels=list(emotions.keys()),
-        colors=['#dc3545', '#28a745', '#ffc107', '#6c757d'],
-        autopct='%1.1f%%'
-    )
-    plt.title('Emotion Distribution')
-    
-    img_buffer = BytesIO()
-    plt.savefig(img_buffer, format='png', bbox_inches='tight')
-    plt.close()
-    img_buffer.seek(0)
-    return img_buffer
-
-def create_analysis_pdf(result):
-    """Generate a PDF report of the sentiment analysis"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
-    
-    # Prepare the story (content)
-    story = []
-    styles = getSampleStyleSheet()
-    title_style = styles['Heading1']
-    heading_style = styles['Heading2']
-    normal_style = styles['Normal']
-    
-    # Title
-    story.append(Paragraph("Sentiment Analysis Report", title_style))
-    story.append(Spacer(1, 12))
-    
-    # Main Metrics
-    story.append(Paragraph("Overall Sentiment", heading_style))
-    story.append(Spacer(1, 6))
-    
-    data = [
-        ["Metric", "Value"],
-        ["Sentiment", result.get('sentiment', 'N/A')],
-        ["Polarity", f"{result.get('polarity', 0):.2f}"]
+        breakdown = ', '.join(f'{name} {seconds:.2f}s' for name, seconds in timings.items())
+        logger.info("Startup timing: %s", breakdown)
+
+def start_warmup():
+    threading.Thread(target=load_analyzer, name='model-warmup', daemon=True).start()
+
+def requires_analyzer(view):
+    """Return 503 with Retry-After until the warm-up has finished."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not analyzer_ready.is_set():
+            message = f'Model failed to load: {analyzer_error}' if analyzer_error else 'Model is still loading'
+            return jsonify({'error': message}), 503, {'Retry-After': '5'}
+        return view(*args, **kwargs)
+    return wrapper
+
+start_warmup()
+
+def analyzer_metrics():
+    """Cache and micro-batching counters, read from the analyzer at scrape time."""
+    if analyzer is None:
+        return []
+    families = []
+    stats = analyzer.cache_stats()
+    tiers = [('sentences', stats['sentences'])]
+    if stats['results']:
+        tiers.append(('results_memory', stats['results']['memory']))
+        if stats['results']['disk']:
+            tiers.append(('results_disk', stats['results']['disk']))
+    for counter in ('hits', 'misses', 'evictions'):
+        families.append((
+            f'sentiment_cache_{counter}_total', 'counter', f'Cache {counter} by tier.',
+            [({'tier': tier}, tier_stats[counter]) for tier, tier_stats in tiers]
+        ))
+    families.append((
+        'sentiment_cache_entries', 'gauge', 'Entries held by each cache tier.',
+        [({'tier': tier}, tier_stats['size']) for tier, tier_stats in tiers]
+    ))
+    dedup = stats['sentence_dedup']
+    families.append((
+        'sentiment_sentences_total', 'counter', 'Sentences analyzed, by how their score was obtained.',
+        [({'source': source}, dedup[source]) for source in ('exact_duplicates', 'near_duplicates', 'cached', 'scored')]
+    ))
+    if hasattr(analyzer.sentiment_pipeline, 'stats'):
+        batcher = analyzer.sentiment_pipeline.stats()
+        families.append(('sentiment_micro_batches_total', 'counter', 'Forward passes run by the micro-batcher.', [({}, batcher['batches'])]))
+        families.append(('sentiment_micro_batch_items_total', 'counter', 'Calls merged into micro-batches.', [({}, batcher['items'])]))
+        families.append(('sentiment_micro_batch_queued', 'gauge', 'Calls waiting for the micro-batcher.', [({}, batcher['queued'])]))
+    return families
+
+registry.register_collector(analyzer_metrics)
+
+def admission_metrics():
+    lanes = admission.stats()['lanes']
+    return [
+        ('sentiment_lane_active', 'gauge', 'Requests being analyzed, by admission lane.',
+         [({'lane': name}, lane['active']) for name, lane in lanes.items()]),
+        ('sentiment_lane_queued', 'gauge', 'Requests waiting for a slot, by admission lane.',
+         [({'lane': name}, lane['queued']) for name, lane in lanes.items()]),
+        ('sentiment_lane_admitted_total', 'counter', 'Requests admitted, by admission lane.',
+         [({'lane': name}, lane['admitted']) for name, lane in lanes.items()]),
+        ('sentiment_lane_rejected_total', 'counter', 'Requests rejected with 503, by admission lane.',
+         [({'lane': name}, lane['rejected']) for name, lane in lanes.items()]),
     ]
+
+registry.register_collector(admission_metrics)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if request.content_length:
+        INPUT_BYTES.observe(request.content_length, route=request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def record_request_time(response):
+    # For streamed responses this is the time to the first byte, not the whole stream
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - g.request_start,
+            route=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=str(response.status_code)
+        )
+    return response
+
+def wants_timings(data=None):
+    """True when the client asked for a per-stage timings block (?timings=1 or "timings": true)."""
+    flag = request.args.get('timings') or request.form.get('timings')
+    if flag is None and isinstance(data, dict):
+        flag = data.get('timings')
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+def requested_fields(data=None):
+    """The result fields asked for with fields=a,b and/or profile=fast|standard|full.
     
-    t = Table(data, colWidths=[200, 200])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(t)
-    story.append(Spacer(1, 20))
-    
-    # Emotions
-    story.append(Paragraph("Emotion Analysis", heading_style))
-    story.append(Spacer(1, 6))
+    Read from the query string, the form or the JSON body. Raises
+    ValueError for unknown fields or profiles.
+    """
+    # Already imported by the warm-up thread once the analyzer is ready
+    from sentiment_model import resolve_fields
+    selection = {}
+    for name in ('fields', 'profile'):
+        value = request.args.get(name) or request.form.get(name)
+        if value is None and isinstance(data, dict):
+            value = data.get(name)
+        selection[name] = value
+    return resolve_fields(**selection)
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def iter_text_paragraphs(stream, max_chars=100000, block_size=64 * 1024):
+    """Yield blank-line separated paragraphs from a text or binary UTF-8 stream.
     
-    emotions = result.get('emotions', {})
-    if emotions:
-        emotion_data = [["Emotion", "Score", "Description"]]
-        for emotion, data in sorted(emotions.items(), key=lambda x: x[1]['score'], reverse=True):
-            emotion_data.append([
-                emotion,
-                f"{data['score']*100:.1f}%",
-                data['description']
-            ])
-        
-        t = Table(emotion_data, colWidths=[100, 100, 200])
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('WORDWRAP', (0, 0), (-1, -1), True)
-        ]))
-        story.append(t)
-    else:
-        story.append(Paragraph("No emotion data available", normal_style))
+    Binary streams are decoded incrementally. A paragraph longer than
+    max_chars is cut at the last line break or space before the limit, so
+    the buffer stays bounded whatever the input looks like.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    while True:
+        block = stream.read(block_size)
+        if isinstance(block, bytes):
+            block_text = decoder.decode(block, final=not block)
+        else:
+            block_text = block
+        buffer = (buffer + block_text).replace('\r\n', '\n')
+        paragraphs = buffer.split('\n\n')
+        buffer = paragraphs.pop()
+        for paragraph in paragraphs:
+            if paragraph.strip():
+                yield paragraph
+        while len(buffer) > max_chars:
+            cut = buffer.rfind('\n', 0, max_chars)
+            if cut <= 0:
+                cut = buffer.rfind(' ', 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+        if not block:
+            break
+    if buffer.strip():
+        yield buffer
+
+def iter_file_chunks(file):
+    """Yield the text of an upload chunk by chunk, straight from its stream.
     
-    story.append(Spacer(1, 20))
+    TXT files yield paragraphs, DOCX files yield document paragraphs and
+    PDFs yield one chunk per page. Nothing is written to disk.
+    """
+    yield from timed_iter(_extract_file_chunks(file), 'file_extraction')
+
+def _extract_file_chunks(file):
+    filename = secure_filename(file.filename).lower()
+    stream = file.stream
     
-    # Key Phrases
-    if result.get('key_phrases'):
-        story.append(Paragraph("Key Phrases", heading_style))
-        story.append(Spacer(1, 6))
-        phrases = [Paragraph(f"• {phrase}", normal_style) for phrase in result['key_phrases']]
-        for phrase in phrases:
-            story.append(phrase)
-        story.append(Spacer(1, 20))
+    if filename.endswith('.txt'):
+        yield from iter_text_paragraphs(stream)
+    elif filename.endswith('.docx'):
+        from docx import Document
+        for paragraph in Document(stream).paragraphs:
+            yield paragraph.text
+    elif filename.endswith('.pdf'):
+        from PyPDF2 import PdfReader
+        for page in PdfReader(stream).pages:
+            yield page.extract_text() or ''
+    else:
+        raise ValueError('Unsupported file format')
+
+def analyze_upload(file, fields):
+    """Analyze an uploaded file incrementally; returns None when it contains no text."""
+    characters = 0
     
-    # Sentence Analysis
-    if result.get('sentence_analysis'):
-        story.append(Paragraph("Sentence Analysis", heading_style))
-        story.append(Spacer(1, 6))
-        
-        for sentence in result['sentence_analysis']:
-            p = Paragraph(
-                f"<b>{sentence['text']}</b><br/>"
-                f"Sentiment: {sentence['sentiment']}, "
-                f"Confidence: {sentence['confidence']*100:.1f}%",
-                normal_style
-            )
-            story.append(p)
-            story.append(Spacer(1, 12))
+    def chunks():
+        nonlocal characters
+        for chunk in iter_file_chunks(file):
+            if chunk.strip():
+                characters += len(chunk)
+                yield chunk
     
-    # Build the PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+    source = chunks()
+    first = next(source, None)
+    if first is None:
+        return None
+    result = analyzer.analyze_chunks(itertools.chain([first], source), fields=fields)
+    INPUT_CHARS.observe(characters, route='/analyze')
+    return result
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: models are loaded and warm."""
+    if analyzer_ready.is_set():
+        return jsonify({'status': 'ready'})
+    status = 'failed' if analyzer_error else 'loading'
+    return jsonify({'status': status, 'error': analyzer_error}), 503
+
 @app.route('/analyze', methods=['POST'])
+@requires_analyzer
 def analyze():
     try:
-        print("Starting text analysis")
-        if 'file' in request.files:
-            print("Processing uploaded file")
-            file = request.files['file']
-            if file and allowed_file(file.filename):
-                text = extract_text_from_file(file)
-                print(f"Extracted text from file: {file.filename}")
-            else:
-                print("Invalid file format")
-                return jsonify({'error': 'Invalid file format'}), 400
+        if is_upload():
+            # Admitted on the body size, before the upload is parsed
+            with admission.admit(upload_cost()):
+                file = request.files.get('file')
+                if not file or not allowed_file(file.filename):
+                    return jsonify({'error': 'Invalid file format'}), 400
+                try:
+                    fields = requested_fields()
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                # Pages and paragraphs are analyzed as they are read from the upload stream
+                with collect_timings() as timings:
+                    result = analyze_upload(file, fields)
+                if result is None:
+                    return jsonify({'error': 'No text provided'}), 400
+                phrase_stats.add(result)
+                logger.debug("Analyzed file: %s", file.filename)
+                return jsonify(analysis_response(result, timings, wants_timings()))
         else:
-            print("Processing JSON data")
             data = request.get_json()
             if data is None:
-                print("No JSON data received")
                 return jsonify({'error': 'No data provided'}), 400
             text = data.get('text', '').strip()
         
         if not text:
-            print("No text provided")
             return jsonify({'error': 'No text provided'}), 400
-            
-        print(f"Analyzing text (length: {len(text)})")
-        result = analyzer.analyze(text)
-        print("Analysis completed successfully")
-        return jsonify(result)
+        try:
+            fields = requested_fields(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
+        INPUT_CHARS.observe(len(text), route='/analyze')
+        with admission.admit(estimate_cost(text)):
+            with collect_timings() as timings:
+                result = analyzer.analyze(text, fields=fields)
+            phrase_stats.add(result)
+        return jsonify(analysis_response(result, timings, wants_timings(data)))
+        
+    except Rejected:
+        raise
     except Exception as e:
-        print(f"Error during analysis: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error during analysis: %s", e)
+        ERRORS.inc(stage='request')
         return jsonify({'error': f'An error occurred during analysis: {str(e)}'}), 500
 
-@app.route('/export/csv', methods=['POST'])
-def export_csv():
-    try:
-        data = request.get_json()
-        if not data:
+def is_upload():
+    return request.mimetype == 'multipart/form-data'
+
+def upload_cost():
+    """Admission cost of an upload or streamed body: its size in bytes, or large when unknown."""
+    if request.content_length is None:
+        return admission.large_cost + 1
+    return request.content_length
+
+@app.errorhandler(Rejected)
+def rejected(e):
+    return jsonify({'error': f'Server is busy ({e.reason}), try again shortly', 'lane': e.lane}), 503, {'Retry-After': str(e.retry_after)}
+
+def analysis_response(result, timings, include_timings):
+    """The /analyze body: the result plus its result_id and, on request, the timings block."""
+    response = dict(result, result_id=result_store.add(result))
+    if include_timings:
+        response['timings'] = {stage: round(seconds, 6) for stage, seconds in timings.items()}
+    return response
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/analyze/stream', methods=['POST'])
+@requires_analyzer
+def analyze_stream():
+    """Server-Sent Events version of /analyze.
+    
+    Sends 'sentiment' (provisional, then final), 'sentences' batches,
+    'emotions', 'key_phrases' and finally 'done' as each stage finishes, so
+    the first results arrive without waiting for the whole document. With
+    fields or profile, only the events for the requested fields are sent.
+    The final result is the same as /analyze's for the same input.
+    """
+    if is_upload():
+        ticket = admission.acquire(upload_cost())
+        try:
+            # Parsing the form can fail too, e.g. with 413 for a body over MAX_CONTENT_LENGTH
+            file = request.files.get('file')
+            if not file or not allowed_file(file.filename):
+                ticket.release()
+                return jsonify({'error': 'Invalid file format'}), 400
+            fields = requested_fields()
+        except ValueError as e:
+            ticket.release()
+            return jsonify({'error': str(e)}), 400
+        except Exception:
+            ticket.release()
+            raise
+        # Pages and paragraphs are analyzed as they are read, as on /analyze
+        events = analyzer.analyze_events(iter_file_chunks(file), fields=fields)
+    else:
+        data = request.get_json(silent=True)
+        if data is None:
             return jsonify({'error': 'No data provided'}), 400
-            
-        csv_content = create_analysis_csv(data)
-        
-        # Create a binary buffer for the file
-        buffer = io.BytesIO()
-        buffer.write(csv_content.encode('utf-8'))
-        buffer.seek(0)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        return send_file(
-            buffer,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'sentiment_analysis_{timestamp}.csv'
+        text = data.get('text', '').strip()
+        if not text:
+            return jsonify({'error': 'No text provided'}), 400
+        try:
+            fields = requested_fields(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        ticket = admission.acquire(estimate_cost(text))
+        # Paragraphs are streamed as they are scored; the final result is /analyze's, from the same result cache
+        events = analyzer.analyze_text_events(text, fields=fields)
+    
+    def generate():
+        streamed = []
+        try:
+            for event, payload in events:
+                if event == 'sentences':
+                    streamed.extend(payload)
+                elif event == 'done':
+                    phrase_stats.add(payload)
+                    result_id = result_store.add(payload)
+                    # Sentences already streamed aren't sent twice. When the result's sentences differ
+                    # (none for a neutral result, or split differently) they are sent for the client to use
+                    if 'sentence_analysis' not in payload or payload['sentence_analysis'] == streamed:
+                        payload = {key: value for key, value in payload.items() if key != 'sentence_analysis'}
+                    payload = dict(payload, result_id=result_id)
+                yield sse_event(event, payload)
+        except Exception as e:
+            logger.exception("Error during streamed analysis: %s", e)
+            ERRORS.inc(stage='request')
+            yield sse_event('error', {'error': f'An error occurred during analysis: {str(e)}'})
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # The lane slot is held until the stream is finished or the client goes away
+    response.call_on_close(ticket.release)
+    return response
+
+def iter_batch_items():
+    """Yield (id, text, error) for each document in a /analyze/batch body.
+    
+    The body is either a JSON array or NDJSON (one JSON value per line). Each
+    item is a string or an object with 'text' and an optional client 'id';
+    items without an id are numbered by position. NDJSON bodies are read
+    line by line so large feeds are never held in memory at once.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        values = (
+            line for line in (raw.strip() for raw in request.stream)
+            if line
         )
+        items = (_parse_ndjson_line(line) for line in values)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON array of texts')
+        items = ((item, None) for item in data)
+    
+    for position, (item, error) in enumerate(items):
+        if error:
+            yield position, None, error
+        elif isinstance(item, str):
+            yield position, item, None
+        elif isinstance(item, dict) and isinstance(item.get('text', ''), str):
+            yield item.get('id', position), item.get('text', ''), None
+        else:
+            yield position, None, 'Expected a string or an object with a text field'
+
+def _parse_ndjson_line(line):
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, f'Invalid JSON line: {str(e)}'
+
+@app.route('/analyze/batch', methods=['POST'])
+@requires_analyzer
+def analyze_batch():
+    # The body is the list of documents, so fields and profile come from the query string
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    ticket = admission.acquire(upload_cost())
+    try:
+        items = iter_batch_items()
+        first = next(items, None)
+    except ValueError as e:
+        ticket.release()
+        return jsonify({'error': str(e)}), 400
+    except Exception:
+        # e.g. 413 while reading a body over MAX_CONTENT_LENGTH
+        ticket.release()
+        raise
+    if first is None:
+        ticket.release()
+        return jsonify({'error': 'No data provided'}), 400
+    
+    def generate():
+        pending = []
         
+        def texts():
+            for item_id, text, error in itertools.chain([first], items):
+                pending.append((item_id, error))
+                yield text or ''
+        
+        # Results come back in input order, one group at a time
+        for result in analyzer.analyze_batch(texts(), fields=fields):
+            item_id, error = pending.pop(0)
+            if not error:
+                phrase_stats.add(result)
+            line = {'id': item_id, 'error': error} if error else {'id': item_id, **result}
+            yield json.dumps(line) + '\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.call_on_close(ticket.release)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of stage latencies, request sizes and cache counters."""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admission/stats')
+def admission_stats():
+    """Active and queued requests per admission lane."""
+    return jsonify(admission.stats())
+
+@app.route('/phrases')
+def top_phrases():
+    """Most frequent key phrases so far: ?sentiment=positive or ?emotion=joy for one group, else all groups."""
+    try:
+        k = int(request.args.get('k', 10))
+    except ValueError:
+        return jsonify({'error': 'k must be an integer'}), 400
+    sentiment, emotion = request.args.get('sentiment'), request.args.get('emotion')
+    if sentiment is None and emotion is None:
+        return jsonify(phrase_stats.summary(k))
+    return jsonify({'phrases': phrase_stats.top(k, sentiment=sentiment, emotion=emotion)})
+
+@app.route('/lexicon')
+@requires_analyzer
+def lexicon_stats():
+    """Version and size of the emotion lexicon currently in use."""
+    return jsonify(analyzer.lexicon_stats())
+
+@app.route('/cache/stats')
+@requires_analyzer
+def cache_stats():
+    return jsonify(dict(analyzer.cache_stats(), result_store=result_store.stats()))
+
+@app.route('/results/<result_id>')
+def get_result(result_id):
+    result = result_store.get(result_id)
+    if result is None:
+        return jsonify({'error': 'Result not found or expired, analyze the text again'}), 404
+    return jsonify(result)
+
+def render_busy():
+    return jsonify({'error': 'Too many reports are being rendered, try again shortly'}), 503, {'Retry-After': '5'}
+
+# Export format -> (render a result to bytes, mimetype)
+EXPORT_FORMATS = {
+    'csv': (lambda result: create_analysis_csv(result).encode('utf-8'), 'text/csv'),
+    'pdf': (lambda result: render_pdf(result).getvalue(), 'application/pdf'),
+}
+
+@app.route('/export/<fmt>/<result_id>')
+def export_result(fmt, result_id):
+    """Download a stored result as CSV or PDF; each format is rendered once per result."""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown export format {fmt!r}'}), 404
+    render, mimetype = EXPORT_FORMATS[fmt]
+    try:
+        data = result_store.rendered(result_id, fmt, render)
+    except RenderBusy:
+        return render_busy()
     except Exception as e:
-        print(f"CSV Export Error: {str(e)}")
+        logger.exception("%s export error: %s", fmt.upper(), e)
+        ERRORS.inc(stage=f'{fmt}_export')
         return jsonify({'error': str(e)}), 500
+    if data is None:
+        return jsonify({'error': 'Result not found or expired, analyze the text again'}), 404
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return send_file(
+        io.BytesIO(data),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=f'sentiment_analysis_{timestamp}.{fmt}'
+    )
+
+def iter_export_items(items):
+    """Yield (label, result or error message) for each entry of a multi-result export.
+    
+    An entry is a full analysis result, a result_id string or an object
+    with a result_id; IDs are looked up in the result store one at a time.
+    """
+    for position, (item, error) in enumerate(items, 1):
+        if isinstance(item, dict) and 'result_id' in item and 'sentiment' not in item:
+            item = item['result_id']
+        if error:
+            yield position, error
+        elif isinstance(item, str):
+            result = result_store.get(item)
+            yield item, result if result is not None else 'Result not found or expired'
+        elif isinstance(item, dict):
+            yield item.get('result_id', position), item
+        else:
+            yield position, 'Expected an analysis result or a result_id'
+
+def stream_csv(chunks):
+    """Stream CSV chunks; an error mid-way can only be logged, as the headers are already sent."""
+    try:
+        yield from chunks
+    except Exception as e:
+        logger.exception("CSV export error: %s", e)
+        ERRORS.inc(stage='csv_export')
+
+@app.route('/export/csv', methods=['POST'])
+def export_csv():
+    """Stream a CSV report for the posted result.
+    
+    A JSON array (or NDJSON body) of results or result IDs exports them all
+    as one CSV, one report after another, reading the body as it goes.
+    """
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        lines = (line for line in (raw.strip() for raw in request.stream) if line)
+        chunks = iter_analyses_csv(iter_export_items(_parse_ndjson_line(line) for line in lines))
+    else:
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        if isinstance(data, list):
+            chunks = iter_analyses_csv(iter_export_items((item, None) for item in data))
+        elif isinstance(data, dict):
+            chunks = iter_analysis_csv(data)
+        else:
+            return jsonify({'error': 'Expected an analysis result or a list of them'}), 400
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(
+        stream_with_context(stream_csv(chunks)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=sentiment_analysis_{timestamp}.csv'}
+    )
 
 @app.route('/export/pdf', methods=['POST'])
 def export_pdf():
     try:
-        print("PDF export started")
         data = request.get_json()
-        print("Received data:", data)
         
         if not data:
-            print("No data provided")
             return jsonify({'error': 'No data provided'}), 400
             
-        print("Creating PDF buffer")
-        pdf_buffer = create_analysis_pdf(data)
+        pdf_buffer = render_pdf(data)
         
-        print("PDF created successfully")
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         return send_file(
             pdf_buffer,
@@ -327,8 +675,11 @@ def export_pdf():
             download_name=f'sentiment_analysis_{timestamp}.pdf'
         )
         
+    except RenderBusy:
+        return render_busy()
     except Exception as e:
-        print("Error in PDF export:", str(e))
+        logger.exception("PDF export error: %s", e)
+        ERRORS.inc(stage='pdf_export')
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
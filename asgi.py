@@ -0,0 +1,387 @@
+"""Async serving mode for the sentiment analysis API.
+
+Exposes the same /analyze and /export/* contracts as the Flask app, but on
+an ASGI event loop, so one process can hold many slow client connections.
+CPU-bound work runs in a bounded thread pool, with a per-request timeout.
+Work is dropped when the client disconnects, and requests are rejected
+with 503 and Retry-After once the pool and its queue are full.
+
+Run with:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from werkzeug.datastructures import FileStorage
+
+# Shares the analyzer and its warm-up with the Flask app
+import app as flask_app
+from exports import submit_pdf, iter_analysis_csv, iter_analyses_csv, RenderBusy
+from metrics import registry, collect_timings, INPUT_CHARS
+from admission import Rejected, estimate_cost
+
+ANALYSIS_WORKERS = int(os.environ.get('ASGI_ANALYSIS_WORKERS', 4))
+QUEUE_SIZE = int(os.environ.get('ASGI_QUEUE_SIZE', 64))
+REQUEST_TIMEOUT = float(os.environ.get('ASGI_REQUEST_TIMEOUT', 60))
+RETRY_AFTER = '5'
+# Same request body limit as the Flask app
+MAX_CONTENT_LENGTH = flask_app.app.config['MAX_CONTENT_LENGTH']
+
+
+class Overloaded(Exception):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class BodySizeLimit:
+    """ASGI middleware answering 413 for request bodies over max_bytes.
+
+    A declared Content-Length over the limit is rejected before the body is
+    read. Otherwise the bytes are counted as the app reads them, so a
+    chunked or understated body fails as soon as it passes the limit,
+    wherever the endpoint is reading it.
+    """
+
+    def __init__(self, app, max_bytes):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        length = dict(scope['headers']).get(b'content-length')
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            return await _too_large()(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_bytes:
+                    raise BodyTooLarge()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _too_large():
+    return JSONResponse({'error': f'Request body is larger than {MAX_CONTENT_LENGTH // (1024 * 1024)} MB'}, status_code=413)
+
+
+class BoundedExecutor:
+    """Thread pool that admits at most workers + queue_size jobs at a time.
+
+    A slot is held until the job actually finishes, even when the caller
+    stops waiting for it. That way a timed-out job still running in a
+    thread keeps counting against the limit. The same goes for an
+    admission ticket passed to run().
+    """
+
+    def __init__(self, workers, queue_size):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis')
+        self.capacity = workers + queue_size
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def _release(self, _):
+        with self._lock:
+            self.in_use -= 1
+
+    async def run(self, request, fn, *args, timeout=REQUEST_TIMEOUT, ticket=None):
+        with self._lock:
+            if self.in_use >= self.capacity:
+                if ticket is not None:
+                    ticket.release()
+                raise Overloaded()
+            self.in_use += 1
+
+        job = self._executor.submit(fn, *args)
+        job.add_done_callback(self._release)
+        if ticket is not None:
+            job.add_done_callback(lambda _: ticket.release())
+        result = asyncio.wrap_future(job)
+        watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+        try:
+            done, _ = await asyncio.wait({result, watcher}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if result in done:
+                return result.result()
+            # Jobs still queued are dropped; a job already running finishes in its thread
+            job.cancel()
+            if watcher in done:
+                raise ClientDisconnected()
+            raise asyncio.TimeoutError()
+        finally:
+            watcher.cancel()
+
+
+def _release_acquired(acquiring):
+    if not acquiring.cancelled() and acquiring.exception() is None:
+        acquiring.result().release()
+
+
+async def _wait_for_disconnect(request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(0.1)
+
+
+executor = BoundedExecutor(ANALYSIS_WORKERS, QUEUE_SIZE)
+# Threads that wait for admission lane slots, kept off the default executor used by exports. At most
+# queue_size requests per lane block in acquire(); the extra thread per lane serves acquisitions that don't
+admission_waits = ThreadPoolExecutor(
+    max_workers=sum(lane.queue_size + 1 for lane in flask_app.admission.lanes.values()),
+    thread_name_prefix='admission'
+)
+app = FastAPI(title='Sentiment Analysis Tool')
+app.add_middleware(BodySizeLimit, max_bytes=MAX_CONTENT_LENGTH)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request, exc):
+    return JSONResponse({'error': 'Server is busy, try again shortly'}, status_code=503, headers={'Retry-After': RETRY_AFTER})
+
+
+@app.exception_handler(Rejected)
+async def rejected(request, exc):
+    return JSONResponse(
+        {'error': f'Server is busy ({exc.reason}), try again shortly', 'lane': exc.lane},
+        status_code=503,
+        headers={'Retry-After': str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(BodyTooLarge)
+async def body_too_large(request, exc):
+    return _too_large()
+
+
+@app.exception_handler(RenderBusy)
+async def render_busy(request, exc):
+    return JSONResponse({'error': 'Too many reports are being rendered, try again shortly'}, status_code=503, headers={'Retry-After': RETRY_AFTER})
+
+
+@app.exception_handler(asyncio.TimeoutError)
+async def timed_out(request, exc):
+    return JSONResponse({'error': 'Analysis timed out'}, status_code=504)
+
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected(request, exc):
+    # Nobody is listening; 499 only shows up in access logs
+    return Response(status_code=499)
+
+
+def _not_ready():
+    error = flask_app.analyzer_error
+    message = f'Model failed to load: {error}' if error else 'Model is still loading'
+    return JSONResponse({'error': message}, status_code=503, headers={'Retry-After': RETRY_AFTER})
+
+
+@app.get('/healthz')
+async def healthz():
+    return {'status': 'ok'}
+
+
+@app.get('/readyz')
+async def readyz():
+    if flask_app.analyzer_ready.is_set():
+        return {'status': 'ready'}
+    status = 'failed' if flask_app.analyzer_error else 'loading'
+    return JSONResponse({'status': status, 'error': flask_app.analyzer_error}, status_code=503)
+
+
+@app.get('/metrics')
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
+
+
+def _run_analysis(fn, *args):
+    # Timings are collected, and key phrases counted, in the worker thread where the stages actually run
+    with collect_timings() as timings:
+        result = fn(*args)
+    if result is not None:
+        flask_app.phrase_stats.add(result)
+    return result, timings
+
+
+def _wants_timings(request, value=None):
+    flag = request.query_params.get('timings', value)
+    return str(flag).lower() in ('1', 'true', 'yes')
+
+
+def _requested_fields(request, values=None):
+    """fields/profile from the query string, else from the form or JSON body; see flask_app.requested_fields."""
+    from sentiment_model import resolve_fields
+    values = values or {}
+    return resolve_fields(
+        fields=request.query_params.get('fields', values.get('fields')),
+        profile=request.query_params.get('profile', values.get('profile'))
+    )
+
+
+async def _admitted(request, cost, fn, *args):
+    """Run fn in the executor once the admission lane for cost has a slot.
+
+    Waiting for the slot happens on a dedicated thread pool sized to the
+    lane queues, so it blocks neither the event loop, an analysis worker
+    nor an export, and every wait is counted by its lane. The slot is
+    released when the job finishes, not when the request gives up on it.
+    """
+    loop = asyncio.get_running_loop()
+    acquiring = loop.run_in_executor(admission_waits, flask_app.admission.acquire, cost)
+    try:
+        ticket = await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # The helper thread may still get the slot after the request is gone
+        acquiring.add_done_callback(_release_acquired)
+        raise
+    return await executor.run(request, fn, *args, ticket=ticket)
+
+
+def _respond(result, timings, include_timings):
+    return flask_app.analysis_response(result, timings, include_timings)
+
+
+@app.post('/analyze')
+async def analyze(request: Request):
+    if not flask_app.analyzer_ready.is_set():
+        return _not_ready()
+
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        length = request.headers.get('content-length')
+        cost = int(length) if length else flask_app.admission.large_cost + 1
+        # Rejected before the body is read when the lane is already full
+        flask_app.admission.lane_for(cost).check()
+        form = await request.form()
+        upload = form.get('file')
+        if upload is None or not flask_app.allowed_file(upload.filename):
+            return JSONResponse({'error': 'Invalid file format'}, status_code=400)
+        try:
+            fields = _requested_fields(request, form)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        file = FileStorage(stream=upload.file, filename=upload.filename)
+        result, timings = await _admitted(request, cost, _run_analysis, flask_app.analyze_upload, file, fields)
+        if result is None:
+            return JSONResponse({'error': 'No text provided'}, status_code=400)
+        return _respond(result, timings, _wants_timings(request, form.get('timings')))
+    else:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JSONResponse({'error': 'No data provided'}, status_code=400)
+        text = str(data.get('text', '')).strip()
+
+    if not text:
+        return JSONResponse({'error': 'No text provided'}, status_code=400)
+    try:
+        fields = _requested_fields(request, data)
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+
+    INPUT_CHARS.observe(len(text), route='/analyze')
+    result, timings = await _admitted(request, estimate_cost(text), _run_analysis, flask_app.analyzer.analyze, text, fields)
+    return _respond(result, timings, _wants_timings(request, data.get('timings')))
+
+
+@app.get('/lexicon')
+async def lexicon_stats():
+    if not flask_app.analyzer_ready.is_set():
+        return _not_ready()
+    return flask_app.analyzer.lexicon_stats()
+
+
+@app.get('/phrases')
+async def top_phrases(k: int = 10, sentiment: str = None, emotion: str = None):
+    stats = flask_app.phrase_stats
+    if sentiment is None and emotion is None:
+        return stats.summary(k)
+    return {'phrases': stats.top(k, sentiment=sentiment, emotion=emotion)}
+
+
+@app.get('/admission/stats')
+async def admission_stats():
+    return flask_app.admission.stats()
+
+
+@app.get('/results/{result_id}')
+async def get_result(result_id: str):
+    result = flask_app.result_store.get(result_id)
+    if result is None:
+        return JSONResponse({'error': 'Result not found or expired, analyze the text again'}, status_code=404)
+    return result
+
+
+@app.get('/export/{fmt}/{result_id}')
+async def export_result(request: Request, fmt: str, result_id: str):
+    if fmt not in flask_app.EXPORT_FORMATS:
+        return JSONResponse({'error': f'Unknown export format {fmt!r}'}, status_code=404)
+    render, mimetype = flask_app.EXPORT_FORMATS[fmt]
+    # Not the analysis executor: a PDF render waits on its own bounded pool, and CSVs are cheap
+    data = await asyncio.to_thread(flask_app.result_store.rendered, result_id, fmt, render)
+    if data is None:
+        return JSONResponse({'error': 'Result not found or expired, analyze the text again'}, status_code=404)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(
+        data,
+        media_type=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=sentiment_analysis_{timestamp}.{fmt}'}
+    )
+
+
+async def _export_payload(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return None
+    return data or None
+
+
+@app.post('/export/csv')
+async def export_csv(request: Request):
+    data = await _export_payload(request)
+    if isinstance(data, list):
+        chunks = iter_analyses_csv(flask_app.iter_export_items((item, None) for item in data))
+    elif isinstance(data, dict):
+        chunks = iter_analysis_csv(data)
+    else:
+        return JSONResponse({'error': 'No data provided'}, status_code=400)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    # Starlette runs the synchronous generator in its thread pool, chunk by chunk
+    return StreamingResponse(
+        flask_app.stream_csv(chunks),
+        media_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=sentiment_analysis_{timestamp}.csv'}
+    )
+
+
+@app.post('/export/pdf')
+async def export_pdf(request: Request):
+    data = await _export_payload(request)
+    if data is None:
+        return JSONResponse({'error': 'No data provided'}, status_code=400)
+    # Rendered in the PDF pool, so report exports don't take analysis slots
+    pdf_buffer = await asyncio.wait_for(asyncio.wrap_future(submit_pdf(data)), REQUEST_TIMEOUT)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return Response(
+        pdf_buffer.getvalue(),
+        media_type='application/pdf',
+        headers={'Content-Disposition': f'attachment; filename=sentiment_analysis_{timestamp}.pdf'}
+    )
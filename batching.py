@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Groups model calls from concurrent requests into shared forward passes.
+
+    Wraps any pipeline-shaped backend (see inference.py) and is itself
+    callable the same way, so it can stand in for the backend transparently.
+    Each call is queued as one unit, and a single worker thread combines
+    whole calls into batches of up to max_batch_size texts, so one call's
+    texts are never split across forward passes. The worker waits at most
+    max_wait_ms for other callers to join, and only when it was busy and
+    another caller is already queued; a lone request never pays the wait.
+    """
+
+    def __init__(self, backend, max_batch_size=32, max_wait_ms=5):
+        self.backend = backend
+        self.tokenizer = backend.tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        # A call taken from the queue that didn't fit in the last batch; starts the next one
+        self._carry = None
+        self._idle_since = time.monotonic()
+        self.batches = 0
+        self.items = 0
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    def __call__(self, texts, batch_size=None, truncation=True):
+        if isinstance(texts, str):
+            texts = [texts]
+        texts = list(texts)
+        if not texts:
+            return []
+        future = Future()
+        self._queue.put((texts, truncation, future))
+        return future.result()
+
+    def _add(self, batch, call):
+        """Add call to batch if its texts fit; otherwise keep it for the next batch. True if added."""
+        if sum(len(texts) for texts, _, _ in batch) + len(call[0]) > self.max_batch_size:
+            self._carry = call
+            return False
+        batch.append(call)
+        return True
+
+    def _collect(self):
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = self._queue.get()
+        batch = [first]
+        worker_was_idle = time.monotonic() - self._idle_since >= self.max_wait
+
+        # Take whatever is already queued without waiting
+        while self._carry is None:
+            try:
+                call = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._add(batch, call)
+
+        # An idle worker or a lone caller dispatches right away, so low load costs no latency
+        if worker_was_idle or len(batch) == 1 or self._carry is not None:
+            return batch
+
+        # Under load, give concurrent requests up to max_wait to join the batch
+        deadline = time.monotonic() + self.max_wait
+        while self._carry is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                call = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            self._add(batch, call)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                # Calls without truncation are rare; run them on their own
+                for truncation in (True, False):
+                    group = [call for call in batch if call[1] is truncation]
+                    if not group:
+                        continue
+                    texts = [text for call_texts, _, _ in group for text in call_texts]
+                    outputs = list(self.backend(texts, batch_size=len(texts), truncation=truncation))
+                    start = 0
+                    for call_texts, _, future in group:
+                        future.set_result(outputs[start:start + len(call_texts)])
+                        start += len(call_texts)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.batches += 1
+            self.items += sum(len(texts) for texts, _, _ in batch)
+            self._idle_since = time.monotonic()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'mean_batch_size': self.items / self.batches if self.batches else 0.0,
+            'queued': self._queue.qsize()
+        }
@@ -0,0 +1,57 @@
+"""Deterministic synthetic corpora for the benchmark suite.
+
+Texts are assembled from a fixed vocabulary of emotion words, modifiers,
+negations and neutral filler, seeded so every run on every machine sees
+exactly the same input.
+"""
+import random
+
+EMOTION_WORDS = [
+    'happy', 'delighted', 'thrilled', 'grateful', 'sad', 'heartbroken', 'lonely', 'angry', 'furious',
+    'annoyed', 'afraid', 'worried', 'nervous', 'surprised', 'amazed', 'disgusted', 'awful', 'trust',
+    'reliable', 'eager', 'hopeful', 'love', 'adore', 'calm', 'peaceful', 'guilty', 'proud', 'ashamed',
+    'confused', 'determined', 'exhausted', 'worn out', 'blown away', 'looking forward'
+]
+MODIFIERS = ['very', 'extremely', 'really', 'slightly', 'somewhat', 'kind of', 'not', 'never', 'barely', 'hardly']
+SUBJECTS = ['The product', 'Our team', 'The support agent', 'This update', 'My order', 'The contract',
+            'The delivery', 'Customer service', 'The new release', 'The hotel', 'The manager']
+VERBS = ['was', 'seemed', 'felt', 'looked', 'became', 'is', 'remains']
+FILLER = ['after the meeting', 'on Tuesday', 'for the third time', 'according to the report',
+          'in the last quarter', 'despite the delay', 'with the invoice attached', 'as a result',
+          'during the onboarding', 'because of the outage', 'before the renewal date']
+
+# name: (number of texts, sentences per text)
+CORPORA = {
+    'tweet': (200, (1, 2)),
+    'review': (50, (6, 12)),
+    # About 50 pages at roughly 500 words a page
+    'document': (1, (3000, 3200)),
+}
+
+
+def sentence(rng):
+    parts = [rng.choice(SUBJECTS), rng.choice(VERBS)]
+    if rng.random() < 0.5:
+        parts.append(rng.choice(MODIFIERS))
+    parts.append(rng.choice(EMOTION_WORDS))
+    if rng.random() < 0.6:
+        parts.append(rng.choice(FILLER))
+    if rng.random() < 0.3:
+        parts.append('and')
+        parts.append(rng.choice(EMOTION_WORDS))
+    return ' '.join(parts) + rng.choice(['.', '.', '.', '!', '?'])
+
+
+def text(rng, sentence_range):
+    count = rng.randint(*sentence_range)
+    sentences = [sentence(rng) for _ in range(count)]
+    # Blank-line paragraphs every few sentences so long documents look like real uploads
+    paragraphs = [' '.join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+    return '\n\n'.join(paragraphs)
+
+
+def generate(name, scale=1.0, seed=1234):
+    """Return the texts of corpus `name`, scaled in count (never below one text)."""
+    count, sentence_range = CORPORA[name]
+    rng = random.Random(f'{seed}:{name}')
+    return [text(rng, sentence_range) for _ in range(max(1, int(count * scale)))]
@@ -0,0 +1,198 @@
+"""Stage-level benchmarks for SentimentAnalyzer and the report exporters.
+
+Times each stage of the analysis separately on deterministic synthetic
+corpora (see corpora.py), writes the timings as JSON and optionally
+compares them against a stored baseline, exiting non-zero on regressions.
+Runs on CPU without network access; the transformer model must already be
+in the local Hugging Face cache.
+
+Timings depend on the machine, so no baseline is shipped: record one on the
+machine that will run the comparisons (e.g. the CI runner) first.
+
+    python benchmarks/run.py --save-baseline            # record benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json --threshold 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+# CPU only and no network, set before torch and transformers are imported
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import corpora  # noqa: E402
+
+STAGES = [
+    'overall_sentiment',
+    'spacy_parse',
+    'lexicon_scoring',
+    'key_phrases',
+    'sentence_analysis',
+    'csv_export',
+    'pdf_export',
+]
+
+DEFAULT_OUTPUT = os.path.join(ROOT, 'benchmarks', 'results.json')
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+
+def time_stage(fn, repeat):
+    """Run fn once untimed, then `repeat` timed runs; return the timings in seconds."""
+    fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def stage_functions(analyzer, texts):
+    """Build a zero-argument callable per stage, with the inputs of later stages prepared up front."""
+    from exports import create_analysis_csv, create_analysis_pdf
+    from sentiment_model import sentence_tokens
+
+    docs = list(analyzer.nlp.pipe(texts, batch_size=analyzer.batch_size))
+    tokens = [sentence_tokens(doc) for doc in docs]
+    sentence_texts = [sent.text for doc in docs for sent in doc.sents]
+    results = [analyzer.analyze(text) for text in texts]
+
+    def sentence_analysis():
+        # Every run must pay for the transformer, not hit the sentence cache
+        analyzer.sentence_cache.clear()
+        return analyzer._sentence_analysis(sentence_texts)
+
+    return {
+        'overall_sentiment': lambda: analyzer._overall_sentiments(texts),
+        'spacy_parse': lambda: list(analyzer.nlp.pipe(texts, batch_size=analyzer.batch_size)),
+        'lexicon_scoring': lambda: analyzer.emotion_engine.score(tokens),
+        'key_phrases': lambda: [analyzer._key_phrases(doc) for doc in docs],
+        'sentence_analysis': sentence_analysis,
+        'csv_export': lambda: [create_analysis_csv(result) for result in results],
+        'pdf_export': lambda: [create_analysis_pdf(result) for result in results],
+    }
+
+
+def run(args):
+    import torch
+    from sentiment_model import SentimentAnalyzer
+
+    analyzer = SentimentAnalyzer(cache_size=0, sentence_cache_size=0, backend=args.backend)
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'torch_threads': torch.get_num_threads(),
+            'backend': analyzer.backend,
+            'scale': args.scale,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'results': {}
+    }
+
+    for name in args.corpora:
+        texts = corpora.generate(name, scale=args.scale, seed=args.seed)
+        print(f"{name}: {len(texts)} texts, {sum(len(text) for text in texts)} characters")
+        functions = stage_functions(analyzer, texts)
+        corpus_results = {}
+        for stage in args.stages:
+            timings = time_stage(functions[stage], args.repeat)
+            median = statistics.median(timings)
+            corpus_results[stage] = {
+                'median_seconds': median,
+                'min_seconds': min(timings),
+                'per_text_ms': median / len(texts) * 1000,
+                'texts': len(texts),
+            }
+            print(f"  {stage:<18} {median * 1000:10.2f} ms  ({median / len(texts) * 1000:.3f} ms/text)")
+        report['results'][name] = corpus_results
+    return report
+
+
+def compare(report, baseline, threshold, stage_thresholds, min_seconds):
+    """Return a list of regression messages; stages missing from either side are skipped."""
+    regressions = []
+    for name, stages in report['results'].items():
+        for stage, current in stages.items():
+            previous = baseline.get('results', {}).get(name, {}).get(stage)
+            if not previous:
+                continue
+            allowed = stage_thresholds.get(stage, threshold)
+            before, after = previous['median_seconds'], current['median_seconds']
+            # Sub-millisecond stages are mostly timer noise; only flag them past an absolute floor
+            if after - before <= min_seconds:
+                continue
+            if after > before * (1 + allowed):
+                regressions.append(
+                    f"{name}/{stage}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms "
+                    f"(+{(after / before - 1) * 100:.1f}%, allowed {allowed * 100:.0f}%)"
+                )
+    return regressions
+
+
+def parse_stage_thresholds(values):
+    thresholds = {}
+    for value in values:
+        stage, _, fraction = value.partition('=')
+        if stage not in STAGES or not fraction:
+            raise argparse.ArgumentTypeError(f"Expected STAGE=FRACTION with STAGE one of {', '.join(STAGES)}, got {value!r}")
+        thresholds[stage] = float(fraction)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the stages of sentiment analysis.')
+    parser.add_argument('--corpora', nargs='+', choices=list(corpora.CORPORA), default=list(corpora.CORPORA))
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply the number of texts per corpus')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per stage (after one warm-up run)')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--backend', default='torch', help='inference backend, see inference.py')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='where to write the JSON results')
+    parser.add_argument('--baseline', help='compare against this results file')
+    parser.add_argument('--save-baseline', action='store_true', help=f'also write the results to {DEFAULT_BASELINE}')
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed slowdown as a fraction, e.g. 0.15 for 15%%')
+    parser.add_argument('--stage-threshold', action='append', default=[], metavar='STAGE=FRACTION',
+                        help='per-stage override of --threshold, may be repeated')
+    parser.add_argument('--min-seconds', type=float, default=0.002,
+                        help='ignore slowdowns smaller than this many seconds')
+    args = parser.parse_args()
+    stage_thresholds = parse_stage_thresholds(args.stage_threshold)
+    if args.baseline and not os.path.exists(args.baseline):
+        # Checked before the benchmarks run, not after
+        parser.error(f"baseline {args.baseline} not found; record one on this machine with --save-baseline first")
+
+    report = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+    if args.save_baseline:
+        with open(DEFAULT_BASELINE, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {DEFAULT_BASELINE}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, stage_thresholds, args.min_seconds)
+        if regressions:
+            print("Performance regressions:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
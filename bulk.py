@@ -0,0 +1,315 @@
+"""Score large datasets offline.
+
+Reads a CSV, JSONL or Parquet file in streaming chunks and fans the chunks
+out to a pool of worker processes. Each worker loads the model once. Each
+worker writes its results as a Parquet part file with a flat schema: one
+row per input row, one float column per emotion, and sentence counts in
+place of the nested sentence list. Part files are written atomically, so
+the output directory is itself the checkpoint. Rerunning the same command
+after a crash or kill skips every chunk that already has a part file.
+
+    python bulk.py reviews.csv results/ --text-column body --id-column review_id --workers 4
+    python bulk.py tweets.jsonl results/ --workers 8 --threads-per-worker 1
+    python bulk.py tweets.jsonl results/ --profile fast
+    python bulk.py tweets.jsonl results/ --cascade-threshold 0.5
+
+Columns of fields left out by --fields/--profile are written as nulls.
+
+The output directory reads back as one table:
+
+    pyarrow.parquet.read_table('results/')
+"""
+import argparse
+import glob
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from collections import deque
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FORMATS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+}
+MANIFEST = '_manifest.json'
+PART_PATTERN = re.compile(r'^part-(\d+)\.parquet$')
+READ_BLOCK_ROWS = 10000
+
+# Set in each worker process by init_worker()
+_analyzer = None
+_group_size = 64
+_fields = None
+_schema = None
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Can't tell the format of {path}, pass --format")
+    return FORMATS[extension]
+
+
+def read_rows(path, fmt, text_column, id_column=None):
+    """Yield (id, text) for every input row, reading the file a block at a time."""
+    columns = [column for column in (text_column, id_column) if column]
+
+    if fmt == 'csv':
+        from pyarrow import csv
+        reader = csv.open_csv(
+            path,
+            convert_options=csv.ConvertOptions(
+                include_columns=columns,
+                column_types={column: pa.string() for column in columns}
+            )
+        )
+        batches = reader
+    elif fmt == 'parquet':
+        batches = pq.ParquetFile(path).iter_batches(batch_size=READ_BLOCK_ROWS, columns=columns)
+    elif fmt == 'jsonl':
+        yield from _read_jsonl(path, text_column, id_column)
+        return
+    else:
+        raise ValueError(f"Unknown input format {fmt!r}")
+
+    for batch in batches:
+        data = batch.to_pydict()
+        texts = data[text_column]
+        ids = data[id_column] if id_column else [None] * len(texts)
+        yield from zip(ids, texts)
+
+
+def _read_jsonl(path, text_column, id_column):
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # One bad line shouldn't stop a million-row run; it is scored as empty
+                print(f"{path}:{line_number}: invalid JSON, scored as empty text", file=sys.stderr)
+                yield None, None
+                continue
+            if isinstance(record, str):
+                yield None, record
+            elif isinstance(record, dict):
+                yield record.get(id_column) if id_column else None, record.get(text_column)
+            else:
+                yield None, None
+
+
+def read_chunks(rows, chunk_size):
+    """Group rows into (chunk_index, [(row, id, text), ...]) with fixed boundaries."""
+    numbered = ((row, item_id, text) for row, (item_id, text) in enumerate(rows))
+    for index in itertools.count():
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield index, chunk
+
+
+def output_schema(emotions):
+    return pa.schema(
+        [
+            ('row', pa.int64()),
+            ('id', pa.string()),
+            ('characters', pa.int64()),
+            ('sentiment', pa.string()),
+            ('polarity', pa.float64()),
+            ('top_emotion', pa.string()),
+        ]
+        + [(f'emotion_{emotion}', pa.float64()) for emotion in emotions]
+        + [
+            ('key_phrases', pa.list_(pa.string())),
+            ('sentences', pa.int32()),
+            ('positive_sentences', pa.int32()),
+            ('negative_sentences', pa.int32()),
+        ]
+    )
+
+
+def flatten(row, item_id, text, result, emotions):
+    """One flat record per analysis result, matching output_schema()."""
+    # Emotions are {name: {'score': ...}}, except in the empty-text result where they are plain floats
+    scores = {
+        name: value['score'] if isinstance(value, dict) else value
+        for name, value in result.get('emotions', {}).items()
+    }
+    sentences = result.get('sentence_analysis', [])
+    record = {
+        'row': row,
+        'id': None if item_id is None else str(item_id),
+        'characters': len(text),
+        'sentiment': result.get('sentiment'),
+        'polarity': float(result['polarity']) if 'polarity' in result else None,
+        'top_emotion': max(scores, key=scores.get) if scores else None,
+    }
+    for emotion in emotions:
+        record[f'emotion_{emotion}'] = float(scores.get(emotion, 0.0)) if 'emotions' in result else None
+    record['key_phrases'] = result.get('key_phrases')
+    if 'sentence_analysis' in result:
+        record['sentences'] = len(sentences)
+        record['positive_sentences'] = sum(1 for s in sentences if s['sentiment'].lower().startswith('pos'))
+        record['negative_sentences'] = sum(1 for s in sentences if s['sentiment'].lower().startswith('neg'))
+    else:
+        record['sentences'] = record['positive_sentences'] = record['negative_sentences'] = None
+    return record
+
+
+def part_path(output_dir, index):
+    return os.path.join(output_dir, f'part-{index:06d}.parquet')
+
+
+def completed_chunks(output_dir):
+    return {
+        int(match.group(1))
+        for match in (PART_PATTERN.match(name) for name in os.listdir(output_dir))
+        if match
+    }
+
+
+def init_worker(backend, threads, group_size, fields=None, cascade_threshold=None):
+    """Load the model once per worker process."""
+    global _analyzer, _group_size, _fields, _schema
+    import torch
+    # Several workers on one machine: keep each to a few threads instead of all of them fighting over every core
+    torch.set_num_threads(threads)
+    from sentiment_model import SentimentAnalyzer, FIELDS
+    _analyzer = SentimentAnalyzer(backend=backend, cascade_threshold=cascade_threshold)
+    _group_size = group_size
+    _fields = tuple(fields) if fields else FIELDS
+    _schema = output_schema(emotion_columns(_analyzer))
+
+
+def emotion_columns(analyzer):
+    emotions = list(analyzer.emotion_engine.emotions)
+    return emotions if 'neutral' in emotions else emotions + ['neutral']
+
+
+def analyze_chunk(index, rows, output_dir):
+    """Score one chunk and write its part file; returns (index, rows, seconds)."""
+    start = time.perf_counter()
+    texts = [text or '' for _, _, text in rows]
+    results = _analyzer.analyze_batch(texts, group_size=_group_size, fields=_fields)
+    emotions = emotion_columns(_analyzer)
+    records = [
+        flatten(row, item_id, text, result, emotions)
+        for (row, item_id, _), text, result in zip(rows, texts, results)
+    ]
+
+    # Write next to the final name and rename, so a killed worker never leaves a partial part file
+    path = part_path(output_dir, index)
+    tmp_path = os.path.join(output_dir, f'.{os.path.basename(path)}.{os.getpid()}.tmp')
+    pq.write_table(pa.Table.from_pylist(records, schema=_schema), tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    return index, len(rows), time.perf_counter() - start
+
+
+def check_manifest(output_dir, manifest):
+    """Record the run settings, or make sure a resumed run uses the same ones."""
+    path = os.path.join(output_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+        if previous != manifest:
+            changed = ', '.join(key for key in manifest if previous.get(key) != manifest[key])
+            raise SystemExit(
+                f"{output_dir} holds a run with different settings ({changed}); "
+                f"use a new output directory or delete it to start over"
+            )
+        return
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def run(args):
+    fmt = args.format or detect_format(args.input)
+    fields = None
+    if args.fields or args.profile:
+        from sentiment_model import resolve_fields
+        try:
+            fields = list(resolve_fields(args.fields, args.profile))
+        except ValueError as e:
+            raise SystemExit(str(e))
+    os.makedirs(args.output, exist_ok=True)
+    manifest = {
+        'input': os.path.abspath(args.input),
+        'format': fmt,
+        'text_column': args.text_column,
+        'id_column': args.id_column,
+        'chunk_size': args.chunk_size,
+        'backend': args.backend,
+    }
+    if fields:
+        manifest['fields'] = fields
+    if args.cascade_threshold is not None:
+        manifest['cascade_threshold'] = args.cascade_threshold
+    check_manifest(args.output, manifest)
+    for stale in glob.glob(os.path.join(args.output, '.part-*.tmp')):
+        os.remove(stale)
+
+    done = completed_chunks(args.output)
+    if done:
+        print(f"Resuming: {len(done)} chunks already written")
+
+    chunks = read_chunks(read_rows(args.input, fmt, args.text_column, args.id_column), args.chunk_size)
+    scored = 0
+    start = time.perf_counter()
+
+    def report(job):
+        nonlocal scored
+        index, count, seconds = job.get()
+        scored += count
+        rate = scored / (time.perf_counter() - start)
+        print(f"part-{index:06d}: {count} rows in {seconds:.1f}s ({scored} rows this run, {rate:.1f} rows/s)")
+
+    # spawn, not fork: each worker starts clean and builds its own torch/spaCy state
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(args.workers, initializer=init_worker,
+                      initargs=(args.backend, args.threads_per_worker, args.group_size, fields,
+                                args.cascade_threshold)) as pool:
+        # Keep a bounded number of chunks in flight so input is read only as fast as it is scored
+        in_flight = deque()
+        for index, rows in chunks:
+            if index in done:
+                continue
+            in_flight.append(pool.apply_async(analyze_chunk, (index, rows, args.output)))
+            if len(in_flight) >= args.workers * 2:
+                report(in_flight.popleft())
+        while in_flight:
+            report(in_flight.popleft())
+
+    print(f"Done: {scored} rows scored this run, results in {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score a CSV, JSONL or Parquet dataset into Parquet part files.')
+    parser.add_argument('input', help='input file (.csv, .jsonl/.ndjson or .parquet)')
+    parser.add_argument('output', help='output directory; rerun with the same arguments to resume')
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())), help='input format, by default from the extension')
+    parser.add_argument('--text-column', default='text', help='column (or JSON field) holding the text')
+    parser.add_argument('--id-column', help='column copied to the output as id')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--threads-per-worker', type=int, default=1, help='torch threads in each worker')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='rows per part file (the unit of checkpointing)')
+    parser.add_argument('--group-size', type=int, default=64, help='texts analyzed together inside a worker')
+    parser.add_argument('--backend', default='torch', help='inference backend, see inference.py')
+    parser.add_argument('--fields', help='comma-separated result fields to compute, see sentiment_model.FIELDS')
+    parser.add_argument('--profile', help='named set of fields: fast, standard or full')
+    parser.add_argument('--cascade-threshold', type=float,
+                        help='score confident texts with the lexicon tier and only the rest with the transformer')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import secrets
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Canonical form used for cache keys: NFC, trimmed, whitespace runs collapsed."""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+class LRUCache:
+    """Thread-safe bounded in-memory cache with least-recently-used eviction."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class SQLiteCache:
+    """On-disk key/value tier that survives restarts.
+
+    Values are JSON strings. Once max_entries is exceeded the oldest
+    entries are evicted in bulk.
+    """
+
+    def __init__(self, path, max_entries=100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_created ON results (created)')
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, value):
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO results (key, value, created) VALUES (?, ?, ?)',
+                (key, value, time.time())
+            )
+            self._size += cursor.rowcount
+            if self._size > self.max_entries:
+                # Evict a tenth of the table at once so eviction isn't paid on every insert
+                excess = self._size - self.max_entries + self.max_entries // 10
+                cursor = self._conn.execute(
+                    'DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY created LIMIT ?)',
+                    (excess,)
+                )
+                self._size -= cursor.rowcount
+                self.evictions += cursor.rowcount
+            self._conn.commit()
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'size': self._size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class ResultCache:
+    """Content-addressed cache of analysis results.
+
+    Keys are a SHA-256 of the model/lexicon version and the normalized text,
+    so a model or lexicon change never serves stale results. Lookups try
+    the in-memory LRU first, then the optional SQLite tier, promoting disk
+    hits into memory. Results are stored as JSON so callers always get
+    their own copy.
+    """
+
+    def __init__(self, version, maxsize=1024, path=None, max_disk_entries=100000):
+        self.version = version
+        self.memory = LRUCache(maxsize)
+        self.disk = SQLiteCache(path, max_disk_entries) if path else None
+
+    def key(self, text, variant=''):
+        """variant tells apart results of the same text with a different shape, e.g. a subset of fields."""
+        digest = hashlib.sha256()
+        digest.update(self.version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalize_text(text).encode('utf-8'))
+        if variant:
+            digest.update(b'\0')
+            digest.update(variant.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, text, variant=''):
+        key = self.key(text, variant)
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)
+        return json.loads(value) if value is not None else None
+
+    def put(self, text, result, variant=''):
+        key = self.key(text, variant)
+        value = json.dumps(result)
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'memory': self.memory.stats(),
+            'disk': self.disk.stats() if self.disk is not None else None
+        }
+
+
+class ResultStore:
+    """Short-lived server-side copies of analysis results, addressed by a random ID.
+
+    Lets clients download exports by ID instead of posting the whole result
+    back. Entries expire ttl seconds after they are added, and the oldest
+    are dropped once there are more than maxsize. Rendered exports are kept
+    with their result, so downloading the same report twice renders it once.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # result_id -> (expires_at, result, {format: bytes}), oldest first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.renders = 0
+
+    def _expire(self, now):
+        while self._entries:
+            result_id, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[result_id]
+            self.evictions += 1
+
+    def add(self, result):
+        """Store result and return its ID."""
+        result_id = secrets.token_urlsafe(16)
+        if self.maxsize <= 0:
+            return result_id
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._entries[result_id] = (now + self.ttl, result, {})
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result_id
+
+    def _entry(self, result_id):
+        with self._lock:
+            self._expire(time.monotonic())
+            return self._entries.get(result_id)
+
+    def get(self, result_id):
+        entry = self._entry(result_id)
+        return entry[1] if entry else None
+
+    def rendered(self, result_id, fmt, render):
+        """Bytes of result_id rendered by render(result), cached per format; None if the ID is unknown or expired."""
+        entry = self._entry(result_id)
+        if entry is None:
+            return None
+        _, result, renders = entry
+        data = renders.get(fmt)
+        if data is not None:
+            with self._lock:
+                self.hits += 1
+            return data
+        # Rendered outside the lock; two concurrent first downloads may both render, which is harmless
+        data = render(result)
+        with self._lock:
+            self.misses += 1
+            self.renders += 1
+            renders[fmt] = data
+        return data
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'renders': self.renders
+        }
@@ -0,0 +1,101 @@
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+# Hash family: h(x) = (a * x + b) mod p, with p small enough that a * x never overflows uint64
+PRIME = (1 << 31) - 1
+
+
+def shingles(text, size=3):
+    """Word n-grams of a normalized sentence, hashed to 32-bit ints."""
+    words = text.lower().split()
+    if len(words) < size:
+        return {zlib.crc32(' '.join(words).encode('utf-8'))}
+    return {
+        zlib.crc32(' '.join(words[i:i + size]).encode('utf-8'))
+        for i in range(len(words) - size + 1)
+    }
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index of sentences seen recently, for reusing scores of near-duplicates.
+
+    Each sentence gets a MinHash signature over its word 3-grams. The
+    signature is split into bands, and sentences that share any band
+    become candidates; a candidate whose estimated Jaccard similarity is at
+    least threshold is a near-duplicate. Sentences shorter than min_words
+    are never matched, since a single changed word ('love' -> 'hate') is a
+    large part of a short sentence. At most maxsize sentences are indexed,
+    oldest dropped first.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, bands=16, min_words=8, maxsize=10000, seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.min_words = min_words
+        self.maxsize = maxsize
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, PRIME, num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, PRIME, num_perm, dtype=np.uint64)[:, None]
+        # key -> signature, oldest first; band hash -> keys in that bucket
+        self._signatures = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def signature(self, text):
+        values = np.fromiter(shingles(text), dtype=np.uint64) % PRIME
+        return ((self._a * values[None, :] + self._b) % PRIME).min(axis=1)
+
+    def _band_keys(self, signature):
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def match(self, key):
+        """Return the indexed near-duplicate of key, or index key and return None.
+
+        key is a normalized sentence. Exact repeats should be caught before
+        this; a sentence is never its own match.
+        """
+        if len(key.split()) < self.min_words:
+            return None
+        signature = self.signature(key)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            candidates = set()
+            for band_key in band_keys:
+                candidates.update(self._buckets.get(band_key, ()))
+            best, best_similarity = None, self.threshold
+            for candidate in candidates:
+                if candidate == key:
+                    continue
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= best_similarity:
+                    best, best_similarity = candidate, similarity
+            if best is not None:
+                return best
+            if self.maxsize > 0 and key not in self._signatures:
+                self._add(key, signature, band_keys)
+            return None
+
+    def _add(self, key, signature, band_keys):
+        self._signatures[key] = signature
+        for band_key in band_keys:
+            self._buckets.setdefault(band_key, set()).add(key)
+        while len(self._signatures) > self.maxsize:
+            old_key, old_signature = self._signatures.popitem(last=False)
+            for band_key in self._band_keys(old_signature):
+                bucket = self._buckets.get(band_key)
+                if bucket is not None:
+                    bucket.discard(old_key)
+                    if not bucket:
+                        del self._buckets[band_key]
+
+    def __len__(self):
+        return len(self._signatures)
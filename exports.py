@@ -0,0 +1,300 @@
+"""CSV and PDF report rendering for analysis results.
+
+Kept apart from app.py so reports can be rendered (and benchmarked) without
+starting the web app. CSV reports are written row by row with the csv module
+so they can be streamed; matplotlib and reportlab are imported inside the
+functions that use them so they don't slow down startup. PDFs render in a
+small bounded thread pool (render_pdf/submit_pdf), using matplotlib's
+object-oriented API so concurrent renders share no plotting state.
+"""
+import csv
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from xml.sax.saxutils import escape
+from cache import LRUCache
+from metrics import timed, timed_iter
+
+class _Echo:
+    """File-like object whose write() hands the line back, so csv.writer can feed a generator."""
+    def write(self, value):
+        return value
+
+def _rows_csv(rows, chunk_size=16 * 1024):
+    """Encode rows as CSV text, yielding chunks of about chunk_size characters."""
+    writer = csv.writer(_Echo(), lineterminator='\n')
+    pending = []
+    size = 0
+    for row in rows:
+        line = '\n' if row is None else writer.writerow(row)
+        pending.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield ''.join(pending)
+
+def _analysis_rows(result):
+    """CSV rows of one report; None marks a blank line between sections."""
+    yield ['MAIN METRICS']
+    yield ['Metric', 'Value']
+    yield ['Sentiment', result.get('sentiment', 'N/A')]
+    yield ['Polarity', result.get('polarity', 0)]
+    
+    # Emotions carry metadata, except in the empty-text result where they are plain scores
+    emotions = [
+        (emotion, data['score'], data.get('description', '')) if isinstance(data, dict) else (emotion, data, '')
+        for emotion, data in result.get('emotions', {}).items()
+    ]
+    yield None
+    yield None
+    yield ['EMOTIONS']
+    yield ['Emotion', 'Score', 'Description']
+    yield from sorted(emotions, key=lambda row: row[1], reverse=True)
+    
+    yield None
+    yield None
+    yield ['KEY PHRASES']
+    yield ['Phrase']
+    for phrase in result.get('key_phrases', []):
+        yield [phrase]
+    
+    yield None
+    yield None
+    yield ['SENTENCE ANALYSIS']
+    yield ['Text', 'Sentiment', 'Confidence']
+    for s in result.get('sentence_analysis', []):
+        yield [s.get('text', ''), s.get('sentiment', ''), s.get('confidence', 0)]
+
+def iter_analysis_csv(result):
+    """Yield the CSV report for one analysis result in chunks, section by section."""
+    return timed_iter(_rows_csv(_analysis_rows(result)), 'csv_export')
+
+def iter_analyses_csv(results):
+    """Yield one CSV holding a report per (label, result) pair, reading results lazily.
+    
+    Each report starts with a RESULT row naming it and then has the same
+    sections as iter_analysis_csv(). A result given as an error string gets
+    an ERROR row instead, so one bad entry doesn't end the download.
+    """
+    def rows():
+        for index, (label, result) in enumerate(results):
+            if index:
+                yield None
+                yield None
+            yield ['RESULT', label]
+            if isinstance(result, dict):
+                yield from _analysis_rows(result)
+            else:
+                yield ['ERROR', result]
+    return timed_iter(_rows_csv(rows()), 'csv_export')
+
+def create_analysis_csv(result):
+    """Convert analysis result to CSV format"""
+    return ''.join(iter_analysis_csv(result))
+
+# PDF rendering runs in its own small pool so report exports can't take CPU from analysis requests
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+PDF_RENDER_QUEUE = int(os.environ.get('PDF_RENDER_QUEUE', 8))
+
+CHART_COLORS = ['#dc3545', '#28a745', '#ffc107', '#6c757d']
+
+# Rendered chart PNGs by emotion-score fingerprint; many reports share the same few distributions
+_chart_cache = LRUCache(128)
+
+def _emotion_scores(emotions):
+    """(emotion, score) pairs, whether emotions carry metadata or are plain scores."""
+    return [
+        (emotion, data['score'] if isinstance(data, dict) else data)
+        for emotion, data in emotions.items()
+    ]
+
+def _chart_png(scores):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
+    # A Figure of our own instead of pyplot's global current figure, so threads can't draw on each other's charts
+    figure = Figure(figsize=(6, 6))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.pie(
+        [score for _, score in scores],
+        labels=[emotion for emotion, _ in scores],
+        colors=CHART_COLORS,
+        autopct='%1.1f%%'
+    )
+    axes.set_title('Emotion Distribution')
+    
+    img_buffer = BytesIO()
+    figure.savefig(img_buffer, format='png', bbox_inches='tight')
+    return img_buffer.getvalue()
+
+def create_emotion_chart_image(emotions):
+    """Create a pie chart for emotions and return it as a BytesIO object."""
+    scores = _emotion_scores(emotions)
+    fingerprint = tuple((emotion, round(score, 4)) for emotion, score in scores)
+    png = _chart_cache.get(fingerprint)
+    if png is None:
+        png = _chart_png(scores)
+        _chart_cache.put(fingerprint, png)
+    return BytesIO(png)
+
+@functools.lru_cache(maxsize=None)
+def _pdf_styles():
+    """Paragraph and table styles, built once and shared by every report."""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+    
+    styles = getSampleStyleSheet()
+    
+    def table_style(header_size, body_size, *extra):
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), header_size),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), body_size),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            *extra
+        ])
+    
+    return {
+        'title': styles['Heading1'],
+        'heading': styles['Heading2'],
+        'normal': styles['Normal'],
+        'metrics_table': table_style(14, 12),
+        'emotions_table': table_style(12, 10, ('WORDWRAP', (0, 0), (-1, -1), True)),
+    }
+
+@timed('pdf_export')
+def create_analysis_pdf(result):
+    """Generate a PDF report of the sentiment analysis"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Image
+    
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+    
+    # Prepare the story (content)
+    story = []
+    styles = _pdf_styles()
+    title_style = styles['title']
+    heading_style = styles['heading']
+    normal_style = styles['normal']
+    
+    # Title
+    story.append(Paragraph("Sentiment Analysis Report", title_style))
+    story.append(Spacer(1, 12))
+    
+    # Main Metrics
+    story.append(Paragraph("Overall Sentiment", heading_style))
+    story.append(Spacer(1, 6))
+    
+    data = [
+        ["Metric", "Value"],
+        ["Sentiment", result.get('sentiment', 'N/A')],
+        ["Polarity", f"{result.get('polarity', 0):.2f}"]
+    ]
+    
+    t = Table(data, colWidths=[200, 200])
+    t.setStyle(styles['metrics_table'])
+    story.append(t)
+    story.append(Spacer(1, 20))
+    
+    # Emotions
+    story.append(Paragraph("Emotion Analysis", heading_style))
+    story.append(Spacer(1, 6))
+    
+    emotions = result.get('emotions', {})
+    if emotions:
+        emotion_data = [["Emotion", "Score", "Description"]]
+        descriptions = {
+            emotion: data.get('description', '') if isinstance(data, dict) else ''
+            for emotion, data in emotions.items()
+        }
+        scores = sorted(_emotion_scores(emotions), key=lambda x: x[1], reverse=True)
+        for emotion, score in scores:
+            emotion_data.append([
+                emotion,
+                f"{score*100:.1f}%",
+                descriptions[emotion]
+            ])
+        
+        t = Table(emotion_data, colWidths=[100, 100, 200])
+        t.setStyle(styles['emotions_table'])
+        story.append(t)
+        
+        if sum(score for _, score in scores) > 0:
+            story.append(Spacer(1, 12))
+            story.append(Image(create_emotion_chart_image(emotions), width=270, height=270))
+    else:
+        story.append(Paragraph("No emotion data available", normal_style))
+    
+    story.append(Spacer(1, 20))
+    
+    # Key Phrases
+    if result.get('key_phrases'):
+        story.append(Paragraph("Key Phrases", heading_style))
+        story.append(Spacer(1, 6))
+        phrases = [Paragraph(f"• {escape(phrase)}", normal_style) for phrase in result['key_phrases']]
+        for phrase in phrases:
+            story.append(phrase)
+        story.append(Spacer(1, 20))
+    
+    # Sentence Analysis
+    if result.get('sentence_analysis'):
+        story.append(Paragraph("Sentence Analysis", heading_style))
+        story.append(Spacer(1, 6))
+        
+        for sentence in result['sentence_analysis']:
+            # Escaped, since Paragraph treats the text as markup
+            p = Paragraph(
+                f"<b>{escape(sentence['text'])}</b><br/>"
+                f"Sentiment: {escape(str(sentence['sentiment']))}, "
+                f"Confidence: {sentence['confidence']*100:.1f}%",
+                normal_style
+            )
+            story.append(p)
+            story.append(Spacer(1, 12))
+    
+    # Build the PDF
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+class RenderBusy(Exception):
+    """The PDF render pool and its queue are full."""
+
+_render_slots = threading.BoundedSemaphore(PDF_RENDER_WORKERS + PDF_RENDER_QUEUE)
+_render_executor = None
+_render_executor_lock = threading.Lock()
+
+def submit_pdf(result):
+    """Queue a PDF render in the bounded pool; returns a Future of the BytesIO.
+    
+    Raises RenderBusy instead of queueing more than PDF_RENDER_QUEUE
+    renders behind the PDF_RENDER_WORKERS running ones.
+    """
+    global _render_executor
+    if not _render_slots.acquire(blocking=False):
+        raise RenderBusy()
+    with _render_executor_lock:
+        if _render_executor is None:
+            _render_executor = ThreadPoolExecutor(max_workers=PDF_RENDER_WORKERS, thread_name_prefix='pdf-render')
+    future = _render_executor.submit(create_analysis_pdf, result)
+    future.add_done_callback(lambda _: _render_slots.release())
+    return future
+
+def render_pdf(result):
+    """Render a PDF in the bounded pool and wait for it."""
+    return submit_pdf(result).result()
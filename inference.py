@@ -0,0 +1,156 @@
+"""Inference backends for the sentence/document sentiment model.
+
+Every backend is called like a transformers text-classification pipeline:
+backend(texts, batch_size=..., truncation=True) returns one
+{'label': ..., 'score': ...} dict per text, and backend.tokenizer is the
+model's tokenizer. SentimentAnalyzer only relies on that contract.
+
+The ONNX backend needs a one-time conversion, which runs automatically on
+first load or ahead of time with:
+
+    python inference.py export --model distilbert-base-uncased-finetuned-sst-2-english
+"""
+import argparse
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnx')
+
+ONNX_CACHE_DIR = os.path.join('models', 'onnx')
+ONNX_MODEL_FILE = 'model.int8.onnx'
+
+
+def onnx_model_dir(model_name, cache_dir=ONNX_CACHE_DIR):
+    return os.path.join(cache_dir, model_name.replace('/', '--'))
+
+
+def export_onnx(model_name, output_dir):
+    """Export model_name to ONNX and quantize its weights to int8.
+
+    The tokenizer and config are saved next to the model so the ONNX
+    backend can load without torch or network access afterwards.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+
+    fp32_path = os.path.join(output_dir, 'model.onnx')
+    sample = tokenizer(['warm-up text'], return_tensors='pt')
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample['input_ids'], sample['attention_mask']),
+            fp32_path,
+            input_names=['input_ids', 'attention_mask'],
+            output_names=['logits'],
+            dynamic_axes={
+                'input_ids': {0: 'batch', 1: 'sequence'},
+                'attention_mask': {0: 'batch', 1: 'sequence'},
+                'logits': {0: 'batch'}
+            },
+            opset_version=14
+        )
+
+    # Write to a temporary name first so a crashed export never leaves a half-written model behind
+    int8_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    quantize_dynamic(fp32_path, int8_path + '.tmp', weight_type=QuantType.QInt8)
+    os.replace(int8_path + '.tmp', int8_path)
+    os.remove(fp32_path)
+
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    return int8_path
+
+
+class OnnxBackend:
+    """Quantized ONNX Runtime classifier with the pipeline's label/score contract."""
+
+    def __init__(self, model_dir, threads=None):
+        import onnxruntime
+        from transformers import AutoConfig, AutoTokenizer
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILE),
+            options,
+            providers=['CPUExecutionProvider']
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.id2label = AutoConfig.from_pretrained(model_dir).id2label
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+    @classmethod
+    def load(cls, model_name, cache_dir=ONNX_CACHE_DIR):
+        model_dir = onnx_model_dir(model_name, cache_dir)
+        if not os.path.exists(os.path.join(model_dir, ONNX_MODEL_FILE)):
+            logger.info("Exporting %s to quantized ONNX in %s (one-time step)...", model_name, model_dir)
+            export_onnx(model_name, model_dir)
+        return cls(model_dir)
+
+    def __call__(self, texts, batch_size=None, truncation=True):
+        import numpy as np
+
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        batch_size = batch_size or len(texts) or 1
+
+        results = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=truncation,
+                return_tensors='np'
+            )
+            inputs = {name: value.astype(np.int64) for name, value in encoded.items() if name in self._input_names}
+            logits = self.session.run(['logits'], inputs)[0]
+
+            # Softmax, shifted by the row max for numerical stability
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            probabilities = exp / exp.sum(axis=1, keepdims=True)
+            for row in probabilities:
+                best = int(row.argmax())
+                results.append({'label': self.id2label[best], 'score': float(row[best])})
+        return results
+
+
+def load_backend(name, model_name, device='cpu'):
+    """Build the named inference backend for model_name."""
+    if name == 'onnx':
+        return OnnxBackend.load(model_name)
+    if name == 'torch':
+        from transformers import pipeline
+        return pipeline(
+            "sentiment-analysis",
+            model=model_name,
+            device=device
+        )
+    raise ValueError(f"Unknown inference backend {name!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage sentiment model inference artifacts.')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    export = subcommands.add_parser('export', help='Export the model to quantized ONNX')
+    export.add_argument('--model', default='distilbert-base-uncased-finetuned-sst-2-english')
+    export.add_argument('--cache-dir', default=ONNX_CACHE_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        path = export_onnx(args.model, onnx_model_dir(args.model, args.cache_dir))
+        print(f"Wrote {path}")
+
+
+if __name__ == '__main__':
+    main()
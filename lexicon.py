@@ -0,0 +1,192 @@
+"""Emotion lexicon: data files, compiled index and matching.
+
+The lexicon lives in data files (emotions.json, modifiers.json and
+context.json under data/lexicon/) rather than in code. read_sources()
+loads them together with a version hash of their contents.
+compile_index() turns them into a binary index directory: a marisa-trie of
+the terms, plus a numpy array of term labels. LexiconIndex memory-maps that
+index read-only, so every worker process on a host shares one copy through
+the page cache. prune_index() removes versions that are no longer in use.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import marisa_trie
+import numpy as np
+
+SOURCE_FILES = ('emotions.json', 'modifiers.json', 'context.json')
+# Joins the tokens of a multi-word term in the trie; never part of a token
+SEPARATOR = '\x1f'
+
+
+def read_sources(source_dir):
+    """Load the lexicon data files; returns (version, sources).
+    
+    version is a hash of the files' contents, so every edit gives a new
+    version. sources holds emotion_words, emotion_metadata,
+    emotion_modifiers and context_modifiers.
+    """
+    digest = hashlib.sha256()
+    contents = {}
+    for name in SOURCE_FILES:
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            data = f.read()
+        digest.update(name.encode('utf-8') + b'\0' + data + b'\0')
+        contents[name] = json.loads(data.decode('utf-8'))
+    
+    emotions = contents['emotions.json']
+    sources = {
+        'emotion_words': {emotion: entry['words'] for emotion, entry in emotions.items()},
+        'emotion_metadata': {
+            emotion: {key: value for key, value in entry.items() if key != 'words'}
+            for emotion, entry in emotions.items()
+        },
+        'emotion_modifiers': contents['modifiers.json'],
+        'context_modifiers': contents['context.json']
+    }
+    return digest.hexdigest()[:16], sources
+
+
+def source_signature(source_dir):
+    """Modification times and sizes of the data files, for cheap change detection."""
+    signature = []
+    for name in SOURCE_FILES:
+        try:
+            stat = os.stat(os.path.join(source_dir, name))
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def _entries(emotion_words, emotion_modifiers, context_modifiers, tokenize):
+    """Yield (tokens, label) for every lexicon entry, tokens lowercased."""
+    for kind, groups in (('emotion', emotion_words), ('modifier', emotion_modifiers), ('context', context_modifiers)):
+        for name, words in groups.items():
+            for word in words:
+                tokens = tuple(token.lower() for token in tokenize(word) if token.strip())
+                if tokens:
+                    yield tokens, (kind, name)
+
+
+def compile_index(sources, version, index_dir, tokenize=str.split):
+    """Compile sources into a binary index at index_dir/version and return its path.
+    
+    An index that already exists is reused, so the first worker on a host
+    compiles and the rest just map it. The index is built in a temporary
+    directory and renamed into place, so readers never see a partial one.
+    """
+    path = os.path.join(index_dir, version)
+    if os.path.isdir(path):
+        return path
+    
+    terms = {}
+    for tokens, label in _entries(sources['emotion_words'], sources['emotion_modifiers'],
+                                  sources['context_modifiers'], tokenize):
+        terms.setdefault(SEPARATOR.join(tokens), set()).add(label)
+    labels = sorted({label for term_labels in terms.values() for label in term_labels})
+    label_index = {label: i for i, label in enumerate(labels)}
+    
+    # Term ids are the trie's own key ids, so the label array is indexed by them directly
+    trie = marisa_trie.Trie(terms)
+    term_labels = np.zeros((len(trie), len(labels)), dtype=np.uint8)
+    for term, term_label_set in terms.items():
+        for label in term_label_set:
+            term_labels[trie.key_id(term), label_index[label]] = 1
+    
+    os.makedirs(index_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=f'.{version}-', dir=index_dir)
+    try:
+        trie.save(os.path.join(tmp_path, 'terms.marisa'))
+        np.save(os.path.join(tmp_path, 'labels.npy'), term_labels)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': version,
+                'emotions': list(sources['emotion_words']),
+                'metadata': sources['emotion_metadata'],
+                'labels': labels,
+                'max_chars': max(map(len, terms), default=0)
+            }, f, ensure_ascii=False)
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another process put the same version in place first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+    return path
+
+
+def prune_index(index_dir, current, keep=3):
+    """Delete compiled versions in index_dir except current and the keep most recent others.
+    
+    A process still mapping a deleted version keeps working: the mapped
+    files stay readable until it reloads. Directories being built (their
+    names start with '.') are left alone.
+    """
+    versions = []
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        if name != current and not name.startswith('.') and os.path.isfile(os.path.join(path, 'meta.json')):
+            versions.append((os.path.getmtime(path), path))
+    versions.sort(reverse=True)
+    for _, path in versions[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class LexiconIndex:
+    """A compiled lexicon index, memory-mapped read-only from disk.
+    
+    Terms are token sequences with labels such as ('emotion', 'joy') or
+    ('modifier', 'intensifiers'); EmotionEngine turns matches into scores.
+    A sentence is matched with one trie prefix query at each token that can
+    start a term.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.path = path
+        self.version = meta['version']
+        self.emotions = meta['emotions']
+        self.metadata = meta['metadata']
+        self._labels = [tuple(label) for label in meta['labels']]
+        self._max_chars = meta['max_chars']
+        self._trie = marisa_trie.Trie()
+        self._trie.mmap(os.path.join(path, 'terms.marisa'))
+        self._term_labels = np.load(os.path.join(path, 'labels.npy'), mmap_mode='r')
+        # Most tokens start no term at all; a set of first tokens skips the trie query for them
+        self._first_tokens = frozenset(term.split(SEPARATOR, 1)[0] for term in self._trie.iterkeys())
+
+    def __len__(self):
+        return len(self._trie)
+
+    def labels(self, term_id):
+        return {self._labels[i] for i in np.flatnonzero(self._term_labels[term_id])}
+
+    def match(self, tokens):
+        """Yield (start, end, term_id) for the lexicon entries in tokens, leftmost-longest.
+        
+        A phrase replaces the words inside it: 'out of the blue' is one
+        match, not also 'blue'. Matching resumes after the end of each match.
+        """
+        trie, first_tokens = self._trie, self._first_tokens
+        text = SEPARATOR.join(tokens) + SEPARATOR
+        offset = 0
+        resume = 0
+        for start, token in enumerate(tokens):
+            if start >= resume and token in first_tokens:
+                window = text[offset:offset + self._max_chars + 1]
+                longest = None
+                for term in trie.prefixes(window):
+                    # Only whole tokens: 'un' is an entry, but must not match the start of 'unhappy'
+                    if window[len(term)] == SEPARATOR and (longest is None or len(term) > len(longest)):
+                        longest = term
+                if longest is not None:
+                    resume = start + longest.count(SEPARATOR) + 1
+                    yield start, resume, trie.key_id(longest)
+            offset += len(token) + 1
+
@@ -0,0 +1,191 @@
+"""In-process metrics with Prometheus text exposition.
+
+Stages of the analysis are wrapped in `timer(stage)`, which records a
+latency histogram and, inside a `collect_timings()` block, adds the
+elapsed time to a per-request breakdown that /analyze can return.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum and count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else _format_value(bound)
+                    lines.append(f'{self.name}_bucket{_format_labels(key + (("le", le),))} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(total)}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """Add a callable returning (name, type, help, [(labels_dict, value), ...]) tuples at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(tuple(labels.items()))} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'sentiment_stage_duration_seconds', 'Time spent in each analysis stage.', ['stage']
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    'sentiment_request_duration_seconds', 'HTTP request latency by route.', ['route', 'method', 'status']
+))
+INPUT_CHARS = registry.register(Histogram(
+    'sentiment_input_characters', 'Characters of text submitted for analysis.', ['route'], buckets=SIZE_BUCKETS
+))
+INPUT_BYTES = registry.register(Histogram(
+    'sentiment_request_body_bytes', 'Request body size by route.', ['route'], buckets=SIZE_BUCKETS
+))
+MODEL_BATCH_SIZE = registry.register(Histogram(
+    'sentiment_model_batch_size', 'Texts per transformer forward pass.', ['kind'], buckets=BATCH_BUCKETS
+))
+ERRORS = registry.register(Counter(
+    'sentiment_errors_total', 'Errors by stage.', ['stage']
+))
+CASCADE_DECISIONS = registry.register(Counter(
+    'sentiment_cascade_decisions_total', 'Texts scored in cascade mode, by level (document or sentence) and deciding tier.', ['level', 'tier']
+))
+
+_timings = contextvars.ContextVar('timings', default=None)
+
+
+@contextmanager
+def collect_timings():
+    """Collect a {stage: seconds} breakdown of the stages timed inside the block."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def record(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed(stage):
+    """Decorator form of timer()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_iter(iterable, stage):
+    """Yield from iterable, timing each step (e.g. reading the next page of an upload)."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            record(stage, time.perf_counter() - start)
+            return
+        record(stage, time.perf_counter() - start)
+        yield item
@@ -0,0 +1,155 @@
+"""Corpus-level key phrase statistics in fixed memory.
+
+A PhraseAggregator takes analysis results one at a time and keeps the most
+frequent key phrases overall, per sentiment label and per emotion. Each of
+those is a Space-Saving sketch that tracks at most `capacity` phrases, so
+memory stays the same however many documents pass through, and the current
+top phrases can be read at any time without going back over the results.
+"""
+import heapq
+import re
+import threading
+
+# Words that open a noun chunk without changing what it is about ('the battery' == 'battery')
+LEADING_WORDS = {
+    'a', 'an', 'the', 'this', 'that', 'these', 'those', 'some', 'any', 'each', 'every', 'no',
+    'my', 'your', 'his', 'her', 'its', 'our', 'their'
+}
+_WORD = re.compile(r"[\w'-]+")
+
+
+def normalize_phrase(phrase):
+    """Lowercase a phrase, drop punctuation and leading determiners and possessives."""
+    words = _WORD.findall(phrase.lower())
+    while words and words[0] in LEADING_WORDS:
+        words = words[1:]
+    return ' '.join(words)
+
+
+def normalize_phrases(phrases):
+    return [normalize_phrase(phrase) for phrase in phrases]
+
+
+class SpaceSaving:
+    """Approximate top-k counter over a stream in fixed memory (Metwally et al.'s Space-Saving).
+
+    At most capacity keys are tracked. A new key arriving when the sketch is
+    full takes the place of the key with the smallest count and starts from
+    that count, which is recorded as its error. A reported count is never
+    below the true one and overestimates it by at most its error. Any key
+    seen more than total / capacity times is guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.total = 0
+        # key -> [count, error]; a heap of (count, key) finds the minimum, with stale entries skipped
+        self._counts = {}
+        self._heap = []
+
+    def add(self, key, weight=1):
+        self.total += weight
+        entry = self._counts.get(key)
+        if entry is not None:
+            entry[0] += weight
+        elif len(self._counts) < self.capacity:
+            entry = self._counts[key] = [weight, 0]
+        else:
+            minimum, evicted = self._pop_min()
+            del self._counts[evicted]
+            entry = self._counts[key] = [minimum + weight, minimum]
+        heapq.heappush(self._heap, (entry[0], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, (count, _) in self._counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, key = heapq.heappop(self._heap)
+            entry = self._counts.get(key)
+            if entry is not None and entry[0] == count:
+                return count, key
+
+    def top(self, k=20):
+        """The k keys with the highest counts: [(key, count, error), ...]."""
+        best = heapq.nlargest(k, self._counts.items(), key=lambda item: item[1][0])
+        return [(key, count, error) for key, (count, error) in best]
+
+    def __len__(self):
+        return len(self._counts)
+
+
+class PhraseAggregator:
+    """Top key phrases across many analysis results, overall, per sentiment label and per emotion.
+
+    Phrases are counted once per document, under the key normalize gives
+    them. normalize takes a list of phrases and returns their keys, so
+    SentimentAnalyzer.phrase_keys can lemmatize them in one batch.
+    """
+
+    def __init__(self, capacity=1000, normalize=normalize_phrases):
+        self.capacity = capacity
+        self.normalize = normalize
+        self.documents = 0
+        self.overall = SpaceSaving(capacity)
+        # Labels and emotions come from the model and the lexicon, so there are only a few of each
+        self.by_sentiment = {}
+        self.by_emotion = {}
+        self._lock = threading.Lock()
+
+    def _sketch(self, sketches, name):
+        sketch = sketches.get(name)
+        if sketch is None:
+            sketch = sketches[name] = SpaceSaving(self.capacity)
+        return sketch
+
+    def add(self, result):
+        """Count the key phrases of one analysis result; results without key phrases are skipped."""
+        if 'key_phrases' not in result:
+            return
+        phrases = result['key_phrases']
+        keys = {key for key in self.normalize(phrases) if key} if phrases else set()
+        # Emotions are {name: {'score': ...}}, except in the empty-text result where they are plain floats.
+        # Every emotion is listed, so only those the document actually expresses count
+        emotions = [
+            emotion for emotion, data in result.get('emotions', {}).items()
+            if isinstance(data, dict) and data.get('score', 0) > 0 and emotion != 'neutral'
+        ]
+        with self._lock:
+            self.documents += 1
+            sketches = [self.overall]
+            if result.get('sentiment'):
+                # The transformer says 'POSITIVE', the TextBlob fallback 'positive'; both count as one label
+                sketches.append(self._sketch(self.by_sentiment, result['sentiment'].lower()))
+            sketches.extend(self._sketch(self.by_emotion, emotion) for emotion in emotions)
+            for sketch in sketches:
+                for key in keys:
+                    sketch.add(key)
+
+    def top(self, k=20, sentiment=None, emotion=None):
+        """Current top k phrases overall, or for one sentiment label (any case) or emotion."""
+        if sentiment is not None:
+            sketch = self.by_sentiment.get(sentiment.lower())
+        elif emotion is not None:
+            sketch = self.by_emotion.get(emotion)
+        else:
+            sketch = self.overall
+        if sketch is None:
+            return []
+        with self._lock:
+            return [
+                {'phrase': key, 'documents': count, 'error': error}
+                for key, count, error in sketch.top(k)
+            ]
+
+    def summary(self, k=10):
+        with self._lock:
+            sentiments = sorted(self.by_sentiment)
+            emotions = sorted(self.by_emotion)
+            documents = self.documents
+        return {
+            'documents': documents,
+            'overall': self.top(k),
+            'by_sentiment': {label: self.top(k, sentiment=label) for label in sentiments},
+            'by_emotion': {emotion: self.top(k, emotion=emotion) for emotion in emotions}
+        }
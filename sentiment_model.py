@@ -1,14 +1,167 @@
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+import numpy as np
 import torch
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 import spacy
-from nltk.tokenize import sent_tokenize
-import numpy as np
 from textblob import TextBlob
 import nltk
-from string import punctuation
+from lexicon import LexiconIndex, compile_index, prune_index, read_sources, source_signature
+from emotion_engine import EmotionEngine
+from cache import LRUCache, ResultCache, normalize_text
+from dedup import NearDuplicateIndex
+from phrases import normalize_phrase
+from inference import load_backend
+from batching import MicroBatcher
+from metrics import timer, ERRORS, MODEL_BATCH_SIZE, CASCADE_DECISIONS
+
+logger = logging.getLogger(__name__)
+
+# Map emotions to their opposites
+OPPOSITE_EMOTIONS = {
+    'joy': 'sadness',
+    'sadness': 'joy',
+    'anger': 'serenity',
+    'serenity': 'anger',
+    'trust': 'disgust',
+    'disgust': 'trust',
+    'fear': 'determination',
+    'determination': 'fear',
+    'surprise': 'anticipation',
+    'anticipation': 'surprise',
+    'love': 'hate',
+    'pride': 'shame',
+    'shame': 'pride'
+}
+
+# spaCy components the analysis never reads; sentences and noun chunks only need the parser and tagger
+SPACY_EXCLUDE = ['ner']
+# Loaded but not run on documents; phrase_keys() applies it to key phrases only
+SPACY_DISABLE = ['lemmatizer']
+# Tokens left out of phrase keys ('my new phones' -> 'new phone')
+PHRASE_KEY_SKIP_POS = {'DET', 'PRON', 'PUNCT'}
+
+MODEL_NAME = "distilbert-base-uncased-finetuned-sst-2-english"
+
+# Lexicon data files, and where their compiled index is kept (shared by every process on the host)
+LEXICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'lexicon')
+LEXICON_INDEX_DIR = os.path.join('models', 'lexicon')
+# Earlier compiled versions kept after a reload, for workers that haven't switched yet
+LEXICON_INDEX_KEEP = 3
+
+# One loaded lexicon version: everything an analysis reads from the lexicon, replaced together on reload
+LexiconState = namedtuple('LexiconState', ['index', 'engine', 'metadata', 'version', 'valence'])
+
+# Blank lines between paragraphs, where streamed text is split for its provisional events
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+# Result fields callers can ask for, and named sets of them
+FIELDS = ('sentiment', 'polarity', 'emotions', 'key_phrases', 'sentence_analysis')
+PROFILES = {
+    'fast': ('sentiment', 'polarity'),
+    'standard': ('sentiment', 'polarity', 'emotions', 'key_phrases'),
+    'full': FIELDS
+}
+
+def resolve_fields(fields=None, profile=None):
+    """Canonical tuple of result fields for a fields list (or comma-separated string) and/or a profile.
+    
+    Both together select the union. Neither selects every field. Raises
+    ValueError for unknown names.
+    """
+    if fields is None and profile is None:
+        return FIELDS
+    selected = set()
+    if profile is not None:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile {profile!r}, expected one of {', '.join(PROFILES)}")
+        selected.update(PROFILES[profile])
+    if fields is not None:
+        if isinstance(fields, str):
+            fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown field(s) {', '.join(map(repr, unknown))}, expected some of {', '.join(FIELDS)}")
+        selected.update(fields)
+    if not selected:
+        raise ValueError('No fields selected')
+    return tuple(field for field in FIELDS if field in selected)
+
+def select_fields(result, fields):
+    """The requested fields of a result; full results are returned untouched."""
+    if fields == FIELDS:
+        return result
+    selected = {field: result[field] for field in fields if field in result}
+    # The cascade tier says who decided sentiment and polarity, so it goes with them
+    if 'tier' in result and ('sentiment' in fields or 'polarity' in fields):
+        selected['tier'] = result['tier']
+    return selected
+
+class ChunkSourceError(Exception):
+    """Wraps an error raised by the iterable feeding analyze_chunks()."""
+
+def _guard_source(chunks):
+    try:
+        yield from chunks
+    except Exception as e:
+        raise ChunkSourceError(str(e)) from e
+
+def sentence_tokens(doc):
+    """Lowercased token lists, one per sentence, as the emotion engine expects."""
+    return [[token.lower_ for token in sent] for sent in doc.sents]
+
+def is_positive_label(label):
+    return label.lower().startswith('pos')
+
+def empty_result():
+    return {
+        'sentiment': 'neutral',
+        'polarity': 0.0,
+        'subjectivity': 0.0,
+        'emotions': {'neutral': 1.0},
+        'confidence_scores': {'neutral': 1.0},
+        'key_phrases': [],
+        'sentence_analysis': []
+    }
+
+def neutral_result(polarity):
+    return {
+        'sentiment': 'neutral',
+        'polarity': polarity,
+        'emotions': {
+            'neutral': {
+                'score': 1.0,
+                'symbol': '😐',
+                'description': 'No strong emotions detected'
+            }
+        },
+        'key_phrases': [],
+        'sentence_analysis': []
+    }
+
+def textblob_sentiment(text):
+    """Fallback sentiment in the same label/score shape as the transformer pipeline."""
+    polarity = TextBlob(text).sentiment.polarity
+    return {
+        'label': 'positive' if polarity > 0 else 'negative' if polarity < 0 else 'neutral',
+        'score': (polarity + 1) / 2  # Convert to 0-1 range
+    }
 
 class SentimentAnalyzer:
-    def __init__(self):
+    def __init__(self, batch_size=32, window_overlap=64, cache_size=1024, cache_path=None,
+                 sentence_cache_size=10000, backend='torch', micro_batch_wait_ms=None,
+                 near_duplicates=False, near_duplicate_threshold=0.8,
+                 lexicon_dir=None, lexicon_index_dir=None, lexicon_reload_interval=None,
+                 cascade_threshold=None):
+        # Number of sentences sent through the transformer per forward pass
+        self.batch_size = batch_size
+        # Tokens shared between consecutive windows when scoring long documents
+        self.window_overlap = window_overlap
+        
         # Initialize NLTK data
         try:
             nltk.data.find('tokenizers/punkt')
@@ -17,523 +170,834 @@ class SentimentAnalyzer:
             
         # Initialize device
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"Device set to use {self.device}")
+        logger.info("Device set to use %s", self.device)
         
         # Load models for different analysis tasks
-        print("Loading sentiment analysis models...")
+        logger.info("Loading sentiment analysis models...")
         
         try:
-            # General sentiment analysis model
-            self.sentiment_pipeline = pipeline(
-                "sentiment-analysis",
-                model="distilbert-base-uncased-finetuned-sst-2-english",
-                device=self.device
-            )
+            # General sentiment analysis model, served by the selected inference backend
+            self.sentiment_pipeline = load_backend(backend, MODEL_NAME, device=self.device)
+            self.backend = backend
             
-            # Comprehensive emotion lexicon based on Plutchik's wheel and NRC emotion lexicon
-            self.emotion_words = {
-                'joy': ['happy', 'joyful', 'delighted', 'pleased', 'glad', 'cheerful', 'content', 'satisfied', 'elated', 'jubilant',
-                       'excited', 'thrilled', 'overjoyed', 'blissful', 'ecstatic', 'merry', 'jolly', 'lively', 'enthusiastic',
-                       'radiant', 'beaming', 'uplifted', 'euphoric', 'gleeful', 'blessed', 'gratified', 'sunny', 'chipper',
-                       'playful', 'lighthearted', 'carefree', 'buoyant', 'exuberant', 'vivacious', 'jovial', 'mirthful',
-                       'dancing', 'singing', 'laughing', 'grinning', 'smiling', 'bouncing', 'floating', 'soaring', 'glowing',
-                       'sparkling', 'shining', 'radiating', 'celebrating', 'rejoicing', 'reveling', 'jubilating', 'triumphant',
-                       'victorious', 'accomplished', 'fulfilled', 'peaceful', 'serene', 'tranquil', 'harmonious', 'balanced',
-                       'optimistic', 'contented', 'pleased', 'cheer', 'bright', 'sunny', 'warm', 'fuzzy', 'tingly', 'hopeful',
-                       'confident', 'proud', 'successful', 'fulfilled', 'relieved', 'thankful', 'grateful', 'blessed', 'lucky',
-                       'fortunate', 'advantaged', 'privileged', 'honored', 'respected', 'admired', 'envied', 'idolized', 'worshipped',
-                       'treasured', 'cherished', 'adored', 'beloved', 'darling', 'sweet', 'dear', 'precious', 'valued', 'priceless'],
-                
-                'sadness': ['sad', 'upset', 'unhappy', 'depressed', 'gloomy', 'miserable', 'heartbroken', 'downcast', 'grieving', 'sorrowful',
-                           'melancholy', 'despair', 'dejected', 'hopeless', 'disappointed', 'regretful', 'lonely', 'hurt',
-                           'desolate', 'anguished', 'devastated', 'forlorn', 'woeful', 'disheartened', 'crestfallen', 'blue',
-                           'despondent', 'inconsolable', 'mournful', 'bereft', 'somber', 'wistful', 'heavy-hearted', 'crushed',
-                           'broken', 'shattered', 'torn', 'wounded', 'damaged', 'suffering', 'aching', 'pained', 'tormented',
-                           'tortured', 'afflicted', 'distressed', 'traumatized', 'grief-stricken', 'lamenting', 'weeping',
-                           'crying', 'sobbing', 'tearful', 'sniffling', 'whimpering', 'moaning', 'sighing', 'yearning',
-                           'pessimistic', 'somber', 'melancholic', 'mournful', 'doleful', 'plaintive', 'elegiac', 'funereal',
-                           'lugubrious', 'dirge-like', 'mournful', 'sorrowful', 'despondent', 'unhappy', 'unlucky',
-                           'unfortunate', 'miserable', 'wretched', 'pitiful', 'pathetic', 'heart-wrenching', 'agonizing',
-                           'agonized', 'anguished', 'anguish', 'anguishful', 'agonized', 'anguished', 'anguish', 'anguishful',
-                           'anguished', 'anguish', 'anguishful', 'anguished', 'anguish', 'anguishful'],
-                
-                'anger': ['angry', 'unhelpful','disappointed','furious', 'irritated', 'annoyed', 'enraged', 'hostile', 'mad', 'outraged', 'bitter', 'hate',
-                         'resentful', 'frustrated', 'agitated', 'irate', 'livid', 'indignant', 'offended', 'provoked',
-                         'seething', 'fuming', 'wrathful', 'incensed', 'infuriated', 'antagonized', 'exasperated', 'heated',
-                         'raging', 'storming', 'vexed', 'waste', 'cross', 'disgruntled', 'sullen', 'temperamental', 'inflamed',
-                         'explosive', 'volcanic', 'burning', 'boiling', 'steaming', 'fierce', 'violent', 'ferocious', 'savage',
-                         'wild', 'berserk', 'rabid', 'overpriced', 'rude', 'vengeful', 'vindictive', 'spiteful', 'malicious', 'hateful', 'loathing',
-                         'resent', 'bitterness', 'ill-will', 'animosity', 'pique', 'umbrage', 'grievance', 'offence', 'indignation', 'exasperation',
-                         'irksomeness', 'exasperating', 'infuriating', 'provocative', 'maddening', 'frenzied', 'manic', 'savage', 'brutal', 'feral',
-                         'frenetic', 'furious', 'fuming', 'wrath', 'ire', 'wrathful', 'incensed', 'outraged', 'indignant', 'offended', 'provoked'],
-                
-                'fear': ['afraid', 'scared', 'fearful', 'terrified', 'anxious', 'worried', 'nervous', 'panicked', 'frightened',
-                        'threatened', 'alarmed', 'horrified', 'paranoid', 'insecure', 'uneasy', 'apprehensive', 'dread',
-                        'petrified', 'phobic', 'timid', 'spooked', 'jittery', 'jumpy', 'shaken', 'trembling', 'intimidated',
-                        'terrorized', 'aghast', 'disturbed', 'frantic', 'restless', 'stressed', 'tense', 'wary',
-                        'quaking', 'quivering', 'shivering', 'tremulous', 'unnerved', 'rattled', 'startled', 'shocked',
-                        'horrified', 'terrifying', 'nightmarish', 'spine-chilling', 'blood-curdling', 'hair-raising',
-                        'cowed', 'daunted', 'dismayed', 'terror-stricken', 'panic-stricken', 'horror-struck',
-                        'paralyzed', 'frozen', 'shuddering', 'cowering', 'cringing', 'flinching', 'recoiling',
-                        'hesitant', 'skittish', 'on-edge', 'overwrought', 'hysterical', 'unhinged', 'distraught',
-                        'haunted', 'tormented', 'persecuted', 'menaced', 'vulnerable', 'exposed', 'defenseless'],
-                
-                'surprise': ['surprised', 'amazed', 'astonished', 'shocked', 'startled', 'stunned', 'bewildered', 'dumbfounded',
-                            'awestruck', 'wonder', 'unexpected', 'incredible', 'unbelievable', 'remarkable', 'extraordinary',
-                            'flabbergasted', 'thunderstruck', 'staggered', 'taken aback', 'astounded', 'speechless', 'spellbound',
-                            'perplexed', 'mystified', 'baffled', 'overwhelmed', 'wonderstruck', 'dazed', 'stupefied',
-                            'gobsmacked', 'mind-blown', 'floored', 'blindsided', 'caught off guard', 'jolted', 'electrified',
-                            'mesmerized', 'entranced', 'captivated', 'transfixed', 'riveted', 'fascinated', 'intrigued',
-                            'marveled', 'agog', 'nonplussed', 'disconcerted', 'confounded', 'dazzled', 'flummoxed',
-                            'thunderstruck', 'boggled', 'flabbergasted', 'stupefied', 'aghast', 'jaw-dropped',
-                            'open-mouthed', 'wide-eyed', 'staggered', 'bowled over', 'blown away', 'knocked for six',
-                            'taken by surprise', 'caught unawares', 'startling', 'unforeseen', 'unanticipated',
-                            'out of the blue', 'bolt from the blue', 'bombshell', 'eye-opener', 'shocker'],
-                
-                'disgust': ['disgusted', 'awful', 'repulsed', 'revolted', 'sickened', 'appalled', 'horrified', 'loathing', 'hateful',
-                           'repugnant', 'offensive', 'distasteful', 'nauseated', 'repelled', 'averse', 'detestable',
-                           'abhorrent', 'odious', 'contemptuous', 'repulsive', 'objectionable', 'despicable', 'deplorable',
-                           'revolting', 'hideous', 'unseemly', 'unsavory', 'unpalatable', 'foul', 'gross', 'nasty',
-                           'stomach-turning', 'queasy', 'nauseous', 'bilious', 'ill', 'sour', 'rancid', 'putrid', 'fetid',
-                           'rank', 'rotten', 'decaying', 'dirty', 'decomposing', 'moldy', 'musty', 'stinking', 'reeking',
-                           'vile', 'repellent', 'grotesque', 'abominable', 'loathsome', 'nauseating', 'squalid', 'vomitous',
-                           'repugnant', 'sickening', 'gag-inducing', 'unclean', 'filthy', 'contaminated', 'tainted',
-                           'polluted', 'defiled', 'corrupted', 'unsanitary', 'unhygienic', 'septic', 'putrefied',
-                           'malodorous', 'foul-smelling', 'noxious', 'offensive', 'repellent', 'unpleasant', 'distressing',
-                           'objectionable', 'disagreeable', 'intolerable', 'insufferable', 'unbearable', 'abhorrent'],
-                
-                'trust': ['trust', 'believe', 'confident', 'faithful', 'reliable', 'dependable', 'honest', 'sincere', 'loyal',
-                         'trustworthy', 'devoted', 'dedicated', 'committed', 'assured', 'certain', 'secure',
-                         'steadfast', 'unwavering', 'staunch', 'authentic', 'genuine', 'credible', 'truthful', 'upright',
-                         'principled', 'ethical', 'honorable', 'respectable', 'upstanding', 'virtuous', 'true',
-                         'constant', 'stable', 'solid', 'steady', 'firm', 'unshakeable', 'resolute', 'determined',
-                         'unfailing', 'unflinching', 'unfaltering', 'unswerving', 'undeviating', 'reliable',
-                         'faith', 'conviction', 'reliance', 'assurance', 'integrity', 'transparency', 'openness',
-                         'candor', 'frankness', 'veracity', 'fidelity', 'allegiance', 'alliance', 'bond',
-                         'rapport', 'understanding', 'confidence', 'credence', 'belief', 'dependence',
-                         'trustable', 'trusting', 'confiding', 'reliant', 'accountable', 'responsible'],
-
-                'anticipation': ['expect', 'anticipate', 'await', 'eager', 'hopeful', 'looking forward', 'prepared', 'ready',
-                                'watchful', 'vigilant', 'alert', 'excited', 'enthusiastic', 'optimistic', 'keen',
-                                'expectant', 'poised', 'primed', 'geared up', 'psyched', 'pumped', 'charged', 'thrilled',
-                                'impatient', 'yearning', 'longing', 'aspiring', 'ambitious', 'determined',
-                                'waiting', 'counting down', 'preparing', 'planning', 'foreseeing', 'predicting',
-                                'projecting', 'envisioning', 'imagining', 'dreaming', 'fantasizing', 'visualizing',
-                                'anticipatory', 'foreseeing', 'on edge', 'suspenseful', 'tense', 'apprehensive',
-                                'restless', 'antsy', 'on tenterhooks', 'in suspense', 'hanging', 'bated breath',
-                                'preemptive', 'proactive', 'forward-looking', 'prescient', 'prophetic', 'foreshadowing'],
-
-                'love': ['love', 'adore', 'cherish', 'affection', 'fond', 'caring', 'romantic', 'passionate', 'tender',
-                        'devoted', 'warmth', 'intimate', 'attachment', 'desire', 'yearning', 'compassion',
-                        'enamored', 'smitten', 'infatuated', 'enchanted', 'besotted', 'devoted', 'doting', 'ardent',
-                        'amorous', 'beloved', 'treasured', 'precious', 'darling', 'dear', 'cherished',
-                        'worshiping', 'idolizing', 'venerating', 'revering', 'admiring', 'attracted', 'drawn to',
-                        'captivated', 'enthralled', 'spellbound', 'mesmerized', 'fascinated', 'intrigued',
-                        'adoration', 'devotion', 'fondness', 'infatuation', 'passion', 'tenderness', 'endearment',
-                        'affectionate', 'loving', 'doting', 'enamored', 'head over heels', 'soulmate', 'sweetheart',
-                        'paramour', 'heartthrob', 'true love', 'puppy love', 'crush', 'lovesick', 'lovestruck',
-                        'pining', 'longing', 'yearning', 'devoted', 'loyal', 'faithful', 'committed', 'unconditional'],
-
-                'serenity': ['calm', 'peaceful', 'tranquil', 'relaxed', 'composed', 'collected', 'centered', 'balanced',
-                            'harmonious', 'zen', 'meditative', 'mindful', 'contemplative', 'still', 'quiet',
-                            'undisturbed', 'untroubled', 'placid', 'serene', 'gentle', 'mild', 'soothing',
-                            'comforting', 'restful', 'easy', 'mellow', 'settled', 'grounded', 'stable',
-                            'unruffled', 'unperturbed', 'equanimous', 'poised', 'at ease', 'content',
-                            'blissful', 'halcyon', 'idyllic', 'unagitated', 'unworried', 'carefree',
-                            'nonchalant', 'imperturbable', 'unflustered', 'level-headed', 'cool-headed',
-                            'self-possessed', 'unflappable', 'becalmed', 'pacific', 'placatory', 'hushed'],
-
-                'anxiety': ['anxious', 'worried', 'nervous', 'uneasy', 'concerned', 'troubled', 'distressed',
-                           'agitated', 'restless', 'edgy', 'tense', 'stressed', 'pressured', 'overwhelmed',
-                           'flustered', 'ruffled', 'uncomfortable', 'awkward', 'self-conscious', 'insecure',
-                           'uncertain', 'hesitant', 'doubtful', 'apprehensive', 'fearful', 'scared', 'panicky',
-                           'jittery', 'on edge', 'frantic', 'alarmed', 'paranoid', 'jumpy', 'fidgety', 'antsy',
-                           'perturbed', 'rattled', 'unnerved', 'unsettled', 'uptight', 'wound up', 'worked up',
-                           'keyed up', 'wired', 'hyper', 'fretful', 'bothered', 'disturbed', 'phobic', 'neurotic'],
-
-                'nostalgia': ['nostalgic', 'reminiscent', 'remembering', 'longing', 'yearning', 'wistful',
-                             'sentimental', 'retrospective', 'dreamy', 'misty-eyed', 'emotional', 'touched',
-                             'moved', 'affected', 'tender', 'warm', 'fond', 'attached', 'connected',
-                             'bittersweet', 'melancholic', 'pining', 'homesick', 'reflective', 'maudlin',
-                             'romanticizing', 'rose-tinted', 'reminiscing', 'bygone', 'evocative', 'throwback',
-                             'retro', 'vintage', 'old-school', 'memory-laden', 'time-honored', 'cherished',
-                             'treasured', 'beloved', 'unforgotten', 'lingering', 'haunting', 'echoing'],
-
-                'guilt': ['guilty', 'remorseful', 'regretful', 'sorry', 'apologetic', 'ashamed', 'conscience-stricken',
-                         'contrite', 'penitent', 'repentant', 'self-reproachful', 'culpable', 'blameworthy',
-                         'at fault', 'responsible', 'answerable', 'liable', 'wrong', 'rueful', 'sheepish',
-                         'self-condemning', 'self-accusing', 'compunctious', 'conscience-smitten', 'self-critical',
-                         'self-blaming', 'abashed', 'chagrined', 'mortified', 'disgraced', 'self-castigating',
-                         'self-flagellating', 'self-punishing', 'reprehensible', 'reproachable', 'burdened'],
-
-                'pride': ['proud', 'accomplished', 'confident', 'satisfied', 'fulfilled', 'successful', 'achieving',
-                         'triumphant', 'victorious', 'winning', 'superior', 'distinguished', 'excellent',
-                         'outstanding', 'exceptional', 'remarkable', 'notable', 'worthy', 'dignified',
-                         'self-assured', 'self-respecting', 'honored', 'esteemed', 'acclaimed', 'celebrated',
-                         'admired', 'respected', 'revered', 'exalted', 'glorified', 'elevated', 'eminent',
-                         'illustrious', 'prestigious', 'renowned', 'acclaimed', 'lauded', 'honored', 'exultant',
-                         'jubilant', 'elated', 'gratified', 'pleased', 'content', 'self-satisfied', 'smug',
-                         'conceited', 'vain', 'boastful', 'arrogant', 'haughty', 'pompous', 'egotistical'],
-
-                'shame': ['ashamed', 'embarrassed', 'humiliated', 'mortified', 'disgraced', 'dishonored',
-                         'stigmatized', 'degraded', 'debased', 'belittled', 'demeaned', 'devalued',
-                         'worthless', 'inferior', 'small', 'insignificant', 'unworthy', 'self-conscious',
-                         'abashed', 'chagrined', 'sheepish', 'red-faced', 'flustered', 'awkward',
-                         'self-loathing', 'discomfited', 'crestfallen', 'shamed', 'ignominious',
-                         'disgraceful', 'scandalous', 'inglorious', 'discredited', 'tarnished',
-                         'sullied', 'besmirched', 'scorned', 'despised', 'ostracized', 'shunned'],
-
-                'confusion': ['confused', 'puzzled', 'perplexed', 'bewildered', 'baffled', 'mystified',
-                            'disoriented', 'lost', 'uncertain', 'unsure', 'unclear', 'ambiguous',
-                            'vague', 'indistinct', 'muddled', 'mixed up', 'addled', 'befuddled',
-                            'discombobulated', 'flummoxed', 'dazed', 'confounded', 'discomposed',
-                            'nonplussed', 'disconcerted', 'at sea', 'at a loss', 'in a fog',
-                            'in a maze', 'in a quandary', 'in a dilemma', 'stumped', 'thrown'],
-
-                'determination': ['determined', 'resolved', 'committed', 'dedicated', 'focused', 'driven',
-                                'motivated', 'ambitious', 'aspiring', 'striving', 'pursuing', 'persevering',
-                                'persistent', 'tenacious', 'steadfast', 'unwavering', 'resolute', 'purposeful',
-                                'goal-oriented', 'single-minded', 'dogged', 'relentless', 'unyielding', 'tireless',
-                                'indefatigable', 'unflagging', 'unfaltering', 'unshakable', 'firm', 'decisive',
-                                'strong-willed', 'iron-willed', 'gritty', 'plucky', 'gutsy', 'staunch', 'adamant',
-                                'uncompromising', 'unrelenting', 'unstoppable', 'indomitable', 'dauntless'],
-
-                'exhaustion': ['exhausted', 'tired', 'fatigued', 'drained', 'spent', 'worn out', 'weary',
-                               'depleted', 'empty', 'burned out', 'overwhelmed', 'overworked', 'stressed',
-                               'strained', 'taxed', 'overtaxed', 'overextended', 'enervated', 'listless',
-                               'lethargic', 'sluggish', 'drowsy', 'run-down', 'beat', 'bushed', 'frazzled',
-                               'pooped', 'knackered', 'done in', 'wiped out', 'zonked', 'dead on one\'s feet',
-                               'dog-tired', 'bone-weary', 'ready to drop', 'drained of energy', 'sapped',
-                               'tuckered out', 'wrung out', 'worn to a frazzle', 'running on empty']
-            }
-
-            # Emotion metadata including symbols and descriptions
-            self.emotion_metadata = {
-                'joy': {
-                    'symbol': '😊',
-                    'description': 'Feeling of great pleasure and happiness'
-                },
-                'sadness': {
-                    'symbol': '😢',
-                    'description': 'Feeling of sorrow or unhappiness'
-                },
-                'anger': {
-                    'symbol': '😠',
-                    'description': 'Strong feeling of annoyance or hostility'
-                },
-                'fear': {
-                    'symbol': '😨',
-                    'description': 'Feeling of being afraid or anxious'
-                },
-                'surprise': {
-                    'symbol': '😲',
-                    'description': 'Feeling of being amazed or astonished'
-                },
-                'disgust': {
-                    'symbol': '🤢',
-                    'description': 'Feeling of revulsion or strong disapproval'
-                },
-                'trust': {
-                    'symbol': '🤝',
-                    'description': 'Feeling of confidence and reliability'
-                },
-                'anticipation': {
-                    'symbol': '🔮',
-                    'description': 'Feeling of excitement about future events'
-                },
-                'love': {
-                    'symbol': '❤️',
-                    'description': 'Deep feeling of affection and attachment'
-                },
-                'serenity': {
-                    'symbol': '🧘',
-                    'description': 'State of being calm and peaceful'
-                },
-                'anxiety': {
-                    'symbol': '😰',
-                    'description': 'Feeling of worry and unease'
-                },
-                'nostalgia': {
-                    'symbol': '📷',
-                    'description': 'Sentimental longing for the past'
-                },
-                'guilt': {
-                    'symbol': '😣',
-                    'description': 'Feeling of remorse for wrongdoing'
-                },
-                'pride': {
-                    'symbol': '🦁',
-                    'description': 'Feeling of satisfaction from achievements'
-                },
-                'shame': {
-                    'symbol': '🙈',
-                    'description': 'Feeling of humiliation or distress'
-                },
-                'confusion': {
-                    'symbol': '🤔',
-                    'description': 'State of being uncertain or puzzled'
-                },
-                'determination': {
-                    'symbol': '💪',
-                    'description': 'Firm resolution to achieve goals'
-                },
-                'exhaustion': {
-                    'symbol': '😫',
-                    'description': 'State of extreme physical or mental fatigue'
-                }
-            }
-
-            # Emotion intensifiers and diminishers
-            self.emotion_modifiers = {
-                'intensifiers': ['very', 'extremely', 'incredibly', 'absolutely', 'totally', 'completely', 'really',
-                               'thoroughly', 'utterly', 'entirely', 'deeply', 'strongly', 'highly', 'intensely',
-                               'exceptionally', 'tremendously', 'extraordinarily', 'immensely', 'profoundly',
-                               'remarkably', 'supremely', 'vastly', 'overwhelmingly', 'abundantly', 'excessively',
-                               'enormously', 'substantially', 'significantly', 'markedly', 'notably',
-                               'insanely', 'ridiculously', 'unbelievably', 'phenomenally', 'outrageously',
-                               'mind-blowingly', 'staggeringly', 'astonishingly', 'shockingly', 'astoundingly',
-                               'monumentally', 'colossally', 'massively', 'hugely', 'immeasurably',
-                               'unimaginably', 'inconceivably', 'indescribably', 'unspeakably', 'incomparably'],
-                               
-                'diminishers': ['somewhat', 'slightly', 'barely', 'hardly', 'scarcely', 'kind of', 'sort of',
-                              'a little', 'rather', 'quite', 'fairly', 'pretty', 'moderately',
-                              'mildly', 'partially', 'relatively', 'nominally', 'marginally', 'minimally',
-                              'faintly', 'vaguely', 'lightly', 'tenuously', 'tentatively', 'insignificantly',
-                              'hardly', 'barely', 'scarcely', 'negligibly', 'imperceptibly', 'minutely',
-                              'infinitesimally', 'microscopically', 'fractionally', 'nominally', 'technically',
-                              'theoretically', 'virtually', 'practically', 'essentially', 'more or less']
-            }
-
-            # Context modifiers
-            self.context_modifiers = {
-                'negations': ['not', 'never', 'no', "n't", 'neither', 'nor', 'none', 'cannot', 'without',
-                            'unlikely', 'impossible', 'nowhere', 'nothing', 'nobody', 'non', 'un', 'dis',
-                            'hardly', 'barely', 'scarcely', 'rarely', 'seldom', 'refuse', 'deny', 'reject',
-                            'prevent', 'avoid', 'stop', 'exclude', 'eliminate', 'remove', 'ban', 'prohibit'],
-                            
-                'temporal': ['now', 'then', 'before', 'after', 'during', 'while', 'when', 'always', 'never',
-                           'sometimes', 'often', 'rarely', 'usually', 'occasionally', 'frequently', 'constantly',
-                           'continuously', 'persistently', 'intermittently', 'periodically', 'regularly',
-                           'sporadically', 'temporarily', 'permanently', 'momentarily', 'briefly', 'lastingly'],
-                           
-                'certainty': ['definitely', 'certainly', 'surely', 'undoubtedly', 'absolutely', 'obviously',
-                            'clearly', 'evidently', 'apparently', 'presumably', 'probably', 'possibly',
-                            'maybe', 'perhaps', 'conceivably', 'supposedly', 'allegedly', 'seemingly',
-                            'ostensibly', 'reportedly', 'reputedly', 'supposedly', 'doubtfully'],
-                            
-                'comparison': ['more', 'less', 'better', 'worse', 'most', 'least', 'best', 'worst',
-                             'similar', 'different', 'like', 'unlike', 'same', 'opposite', 'equal',
-                             'unequal', 'comparable', 'incomparable', 'analogous', 'contrasting',
-                             'matching', 'mismatching', 'corresponding', 'diverging'],
-                             
-                'causation': ['because', 'since', 'therefore', 'thus', 'hence', 'consequently',
-                            'as a result', 'due to', 'owing to', 'thanks to', 'based on', 'leads to',
-                            'results in', 'causes', 'affects', 'influences', 'impacts', 'determines']
-            }
+            # Share forward passes between concurrent requests instead of running each call alone
+            if micro_batch_wait_ms is not None:
+                self.sentiment_pipeline = MicroBatcher(
+                    self.sentiment_pipeline,
+                    max_batch_size=batch_size,
+                    max_wait_ms=micro_batch_wait_ms
+                )
             
         except Exception as e:
-            print(f"Error loading transformer models: {str(e)}")
-            print("Falling back to basic sentiment analysis...")
+            logger.warning("Error loading transformer models: %s", e)
+            logger.warning("Falling back to basic sentiment analysis...")
             self.sentiment_pipeline = None
+            self.backend = 'textblob'
+        
+        # Cascade mode: texts the cheap lexicon tier is sure about (|TextBlob polarity| at least
+        # this, not contradicted by emotion words) skip the transformer. None scores everything
+        # with the transformer; without one there is nothing to escalate to
+        self.cascade_threshold = cascade_threshold if self.sentiment_pipeline else None
         
         # Load spaCy model for text processing and key phrase extraction
         try:
-            self.nlp = spacy.load('en_core_web_sm')
+            self.nlp = spacy.load('en_core_web_sm', exclude=SPACY_EXCLUDE, disable=SPACY_DISABLE)
         except OSError:
-            print("Downloading spaCy model...")
+            logger.info("Downloading spaCy model...")
             spacy.cli.download('en_core_web_sm')
-            self.nlp = spacy.load('en_core_web_sm')
+            self.nlp = spacy.load('en_core_web_sm', exclude=SPACY_EXCLUDE, disable=SPACY_DISABLE)
 
-    def analyze(self, text):
-        """Analyze the sentiment and emotions of the given text."""
-        if not text or not text.strip():
-            return {
-                'sentiment': 'neutral',
-                'polarity': 0.0,
-                'subjectivity': 0.0,
-                'emotions': {'neutral': 1.0},
-                'confidence_scores': {'neutral': 1.0},
-                'key_phrases': [],
-                'sentence_analysis': []
-            }
+        # Emotion lexicon from its data files, compiled into a shared memory-mapped index.
+        # Swapped as a whole on reload, so each analysis uses one consistent version
+        self.lexicon_dir = lexicon_dir or LEXICON_DIR
+        self.lexicon_index_dir = lexicon_index_dir or LEXICON_INDEX_DIR
+        self._lexicon_lock = threading.Lock()
+        self._lexicon_signature = source_signature(self.lexicon_dir)
+        self._lexicon = self._load_lexicon()
+        if lexicon_reload_interval:
+            threading.Thread(
+                target=self._watch_lexicon,
+                args=(lexicon_reload_interval,),
+                name='lexicon-watcher',
+                daemon=True
+            ).start()
+        
+        # Whole-document results keyed by text, model and lexicon version, plus per-sentence
+        # transformer scores so partially overlapping documents reuse each other's work.
+        # The lexicon version goes into each key (see _cache_variant) so a reload needs no flush
+        self.version = f"{MODEL_NAME}+{self.backend}"
+        if self.cascade_threshold is not None:
+            self.version += f"+cascade{self.cascade_threshold:g}"
+        self.cache = ResultCache(self.version, maxsize=cache_size, path=cache_path) if cache_size or cache_path else None
+        self.sentence_cache = LRUCache(sentence_cache_size)
+        # The same key phrases come up over and over, so their lemmatized keys are cached too
+        self.phrase_key_cache = LRUCache(sentence_cache_size)
+        
+        # Boilerplate (signatures, disclaimers, quoted replies) repeats with small variations;
+        # optionally reuse the score of a recent sentence that is nearly the same
+        self.near_duplicates = NearDuplicateIndex(
+            threshold=near_duplicate_threshold,
+            maxsize=sentence_cache_size
+        ) if near_duplicates else None
+        self.dedup_stats = {'sentences': 0, 'exact_duplicates': 0, 'near_duplicates': 0, 'cached': 0, 'scored': 0}
+        self._dedup_lock = threading.Lock()
+
+    def _load_lexicon(self):
+        version, sources = read_sources(self.lexicon_dir)
+        # spaCy's tokenizer, so multi-word entries like 'worn out' or 'as a result' line up with sentence tokens
+        path = compile_index(
+            sources,
+            version,
+            self.lexicon_index_dir,
+            tokenize=lambda phrase: [token.text for token in self.nlp.tokenizer(phrase)]
+        )
+        index = LexiconIndex(path)
+        engine = EmotionEngine(index, OPPOSITE_EMOTIONS)
+        # +1 for positive emotions, -1 for negative ones, 0 for the rest, in engine order
+        valence = np.array([index.metadata.get(emotion, {}).get('valence', 0) for emotion in engine.emotions], dtype=float)
+        return LexiconState(index, engine, index.metadata, version, valence)
 
-        # Preprocess text
-        text = text.strip()
+    def reload_lexicon(self):
+        """Load the lexicon data files again; returns True when the version changed.
         
-        try:
-            # Get overall sentiment using transformers if available
-            if self.sentiment_pipeline:
-                sentiment_result = self.sentiment_pipeline(text)[0]
-                overall_sentiment = {
-                    'sentiment': sentiment_result['label'],
-                    'polarity': sentiment_result['score']
-                }
-            else:
-                # Fallback to TextBlob
-                blob = TextBlob(text)
-                polarity = blob.sentiment.polarity
-                overall_sentiment = {
-                    'sentiment': 'positive' if polarity > 0 else 'negative' if polarity < 0 else 'neutral',
-                    'polarity': (polarity + 1) / 2  # Convert to 0-1 range
-                }
-            
-            # Process text in sentences for better context understanding
-            sentences = [sent for sent in self.nlp(text).sents]
-            
-            # Initialize emotion tracking
-            emotions = {emotion: 0.0 for emotion in self.emotion_words}
-            confidence_scores = {emotion: 0.0 for emotion in self.emotion_words}
-            total_emotional_content = 0.0
+        The new lexicon is compiled and loaded before it replaces the old one
+        in a single assignment. Analyses already running finish with the
+        version they started with. The transformer is untouched.
+        """
+        with self._lexicon_lock:
+            self._lexicon_signature = source_signature(self.lexicon_dir)
+            state = self._load_lexicon()
+            if state.version == self._lexicon.version:
+                return False
+            self._lexicon = state
+        logger.info("Lexicon reloaded: version %s, %d terms", state.version, len(state.index))
+        prune_index(self.lexicon_index_dir, state.version, keep=LEXICON_INDEX_KEEP)
+        return True
+
+    def _watch_lexicon(self, interval):
+        while True:
+            time.sleep(interval)
+            if source_signature(self.lexicon_dir) == self._lexicon_signature:
+                continue
+            try:
+                self.reload_lexicon()
+            except Exception as e:
+                # A half-saved or invalid file: keep serving the current lexicon until the next change
+                logger.exception("Lexicon reload failed, keeping version %s: %s", self._lexicon.version, e)
+
+    @property
+    def lexicon(self):
+        return self._lexicon.index
+
+    @property
+    def emotion_engine(self):
+        return self._lexicon.engine
+
+    @property
+    def emotion_metadata(self):
+        return self._lexicon.metadata
+
+    def lexicon_stats(self):
+        lexicon = self._lexicon
+        return {
+            'version': lexicon.version,
+            'terms': len(lexicon.index),
+            'emotions': len(lexicon.engine.emotions),
+            'source': self.lexicon_dir,
+            'index': lexicon.index.path
+        }
+
+    def cache_stats(self):
+        return {
+            'results': self.cache.stats() if self.cache else None,
+            'sentences': self.sentence_cache.stats(),
+            'sentence_dedup': dict(self.dedup_stats)
+        }
+
+    def _classify(self, texts):
+        """Run the transformer over many texts in length-sorted batches.
+        
+        Sorting by length keeps texts of similar size together so each batch
+        pads as little as possible. Results are returned in the input order.
+        """
+        results = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            MODEL_BATCH_SIZE.observe(len(bucket), kind='sentences')
+            with timer('model_inference'):
+                outputs = self.sentiment_pipeline(
+                    [texts[i] for i in bucket],
+                    batch_size=len(bucket),
+                    truncation=True
+                )
+            for i, output in zip(bucket, outputs):
+                results[i] = output
+        return results
+
+    def _windows(self, text):
+        """Yield (text, token_count) windows that fit the model's input length.
+        
+        Long documents are tokenized one bounded character segment at a time
+        and cut into windows of at most model_max_length tokens, with
+        window_overlap tokens repeated between neighbours so no sentence loses
+        its context at a boundary. Only one segment is tokenized at a time, so
+        memory does not grow with the document.
+        """
+        tokenizer = self.sentiment_pipeline.tokenizer
+        window_size = min(tokenizer.model_max_length, 512) - tokenizer.num_special_tokens_to_add()
+        overlap = min(self.window_overlap, window_size // 2)
+        segment_chars = window_size * 8
+        
+        position = 0
+        while position < len(text):
+            segment = text[position:position + segment_chars]
+            offsets = tokenizer(segment, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+            at_end = position + len(segment) >= len(text)
+            if not offsets:
+                # A run of whitespace with no tokens; the document may go on after it
+                position += len(segment)
+                continue
             
-            # Analyze each sentence for emotions
-            for sent in sentences:
-                sent_text = sent.text.lower()
-                sent_doc = self.nlp(sent_text)
-                
-                # Track context for the sentence
-                context = {
-                    'negated': False,
-                    'intensity': 1.0,
-                    'conditional': False
-                }
-                
-                # First pass: check for modifiers
-                for token in sent_doc:
-                    word = token.text.lower()
-                    
-                    # Check for negations
-                    if word in self.context_modifiers['negations']:
-                        context['negated'] = not context['negated']
-                    
-                    # Check for intensifiers/diminishers
-                    if word in self.emotion_modifiers['intensifiers']:
-                        context['intensity'] *= 1.5
-                    elif word in self.emotion_modifiers['diminishers']:
-                        context['intensity'] *= 0.5
-                
-                # Second pass: analyze emotions
-                for emotion, words in self.emotion_words.items():
-                    # Count emotion words in sentence
-                    emotion_words_found = [word for word in sent_doc if word.text.lower() in words]
-                    if emotion_words_found:
-                        # Calculate base score for this emotion in this sentence
-                        base_score = len(emotion_words_found) * context['intensity']
-                        
-                        # Apply negation if present
-                        if context['negated']:
-                            # When negated, reduce the score and potentially contribute to opposite emotions
-                            base_score *= -0.5
-                            
-                            # Map emotions to their opposites
-                            opposite_emotions = {
-                                'joy': 'sadness',
-                                'sadness': 'joy',
-                                'anger': 'serenity',
-                                'serenity': 'anger',
-                                'trust': 'disgust',
-                                'disgust': 'trust',
-                                'fear': 'determination',
-                                'determination': 'fear',
-                                'surprise': 'anticipation',
-                                'anticipation': 'surprise',
-                                'love': 'hate',
-                                'pride': 'shame',
-                                'shame': 'pride'
-                            }
-                            
-                            # Add score to opposite emotion if it exists
-                            if emotion in opposite_emotions:
-                                emotions[opposite_emotions[emotion]] += abs(base_score) * 0.7
-                        
-                        # Add the score to the emotion
-                        emotions[emotion] += abs(base_score)
-                        total_emotional_content += abs(base_score)
-                        
-                        # Update confidence score for this emotion
-                        confidence_scores[emotion] = max(confidence_scores[emotion], abs(base_score))
+            if len(offsets) > window_size:
+                count = window_size
+            elif at_end:
+                count = len(offsets)
+            else:
+                # The last token may be cut off by the segment boundary
+                count = max(len(offsets) - 1, 1)
             
-            # Normalize emotion scores if there was any emotional content
-            if total_emotional_content > 0:
-                emotions = {k: v/total_emotional_content for k, v in emotions.items()}
-                
-                # Filter out weak emotions (less than 10% contribution)
-                threshold = 0.1
-                emotions = {k: v for k, v in emotions.items() if v > threshold}
-                
-                # Re-normalize after filtering
-                total = sum(emotions.values())
-                if total > 0:  # Ensure we don't divide by zero
-                    emotions = {k: v/total for k, v in emotions.items()}
+            yield segment[offsets[0][0]:offsets[count - 1][1]], count
             
-            # If no significant emotions were found or sentiment is neutral, return neutral
-            if not emotions or (overall_sentiment['sentiment'] == 'neutral' and overall_sentiment['polarity'] < 0.2):
-                return {
-                    'sentiment': 'neutral',
-                    'polarity': overall_sentiment['polarity'],
-                    'emotions': {
-                        'neutral': {
-                            'score': 1.0,
-                            'symbol': '😐',
-                            'description': 'No strong emotions detected'
-                        }
-                    },
-                    'key_phrases': [],
-                    'sentence_analysis': []
+            if at_end and count == len(offsets):
+                break
+            # A sparse segment with no more than overlap tokens is moved past whole, not one token at a time
+            next_token = count - overlap if count > overlap else count
+            position += offsets[next_token][0] if next_token < len(offsets) else len(segment)
+
+    def _window_weights(self, texts):
+        """Return (total_weight, positive_weight) for each text.
+        
+        Each window's positive probability is weighted by its token count;
+        the weighted mean decides the document label. Windows from all texts
+        share batches, and only one batch is held at a time. Weights from
+        several chunks of one document can simply be summed.
+        """
+        if not self.sentiment_pipeline:
+            # Fallback to TextBlob, weighted by character count
+            with timer('model_inference'):
+                return [(float(len(text)), len(text) * textblob_sentiment(text)['score']) for text in texts]
+        
+        total_weight = [0.0] * len(texts)
+        positive_weight = [0.0] * len(texts)
+        batch = []
+        
+        def flush():
+            MODEL_BATCH_SIZE.observe(len(batch), kind='windows')
+            with timer('model_inference'):
+                outputs = self.sentiment_pipeline([window for _, window, _ in batch], batch_size=len(batch), truncation=True)
+            for (index, _, weight), output in zip(batch, outputs):
+                positive = output['score'] if is_positive_label(output['label']) else 1 - output['score']
+                total_weight[index] += weight
+                positive_weight[index] += weight * positive
+            batch.clear()
+        
+        for index, text in enumerate(texts):
+            for window, weight in self._windows(text):
+                batch.append((index, window, weight))
+                if len(batch) >= self.batch_size:
+                    flush()
+        if batch:
+            flush()
+        
+        return list(zip(total_weight, positive_weight))
+
+    def _sentiment_from_weights(self, total_weight, positive_weight):
+        positive = positive_weight / total_weight if total_weight else 0.5
+        if not self.sentiment_pipeline:
+            return {
+                'sentiment': 'positive' if positive > 0.5 else 'negative' if positive < 0.5 else 'neutral',
+                'polarity': positive
+            }
+        return {
+            'sentiment': 'POSITIVE' if positive >= 0.5 else 'NEGATIVE',
+            'polarity': max(positive, 1 - positive)
+        }
+
+    def _first_tier(self, texts, lexicon=None):
+        """Cascade first tier: the positive probability of each text it is confident about, else None.
+        
+        TextBlob polarity gives the direction and strength. The emotion
+        lexicon, with each emotion's valence, must not point the other way,
+        so 'not happy' or sarcasm that TextBlob misreads as positive goes to
+        the transformer. A text is decided here when |polarity| is at least
+        cascade_threshold and the lexicon agrees or has no emotion words in it.
+        """
+        lexicon = lexicon or self._lexicon
+        with timer('first_tier'):
+            # Tokenizer-only, one sentence per text, so a decision doesn't depend on whether the text was parsed
+            scores, _ = lexicon.engine.raw_scores(self._emotion_documents(texts))
+            lexicon_valence = scores @ lexicon.valence
+            decisions = []
+            for text, valence in zip(texts, lexicon_valence):
+                polarity = TextBlob(text).sentiment.polarity
+                if abs(polarity) >= self.cascade_threshold and polarity * valence >= 0:
+                    decisions.append((1 + polarity) / 2)
+                else:
+                    decisions.append(None)
+        return decisions
+
+    def _cascade_weights(self, texts, lexicon=None):
+        """_window_weights() in cascade mode, plus the tier that decided each text.
+        
+        Texts the first tier decides are weighted by their transformer token
+        count, like windows, so chunks of one document decided by different
+        tiers still add up.
+        """
+        decisions = self._first_tier(texts, lexicon)
+        escalated = [i for i, positive in enumerate(decisions) if positive is None]
+        weights = [None] * len(texts)
+        for i, escalated_weights in zip(escalated, self._window_weights([texts[i] for i in escalated])):
+            weights[i] = escalated_weights
+        tokenizer = self.sentiment_pipeline.tokenizer
+        for i, positive in enumerate(decisions):
+            if positive is not None:
+                tokens = max(len(tokenizer(texts[i], add_special_tokens=False)['input_ids']), 1)
+                weights[i] = (float(tokens), tokens * positive)
+        
+        CASCADE_DECISIONS.inc(len(texts) - len(escalated), level='document', tier='lexicon')
+        CASCADE_DECISIONS.inc(len(escalated), level='document', tier='transformer')
+        return weights, ['transformer' if positive is None else 'lexicon' for positive in decisions]
+
+    def _overall_sentiments(self, texts, lexicon=None):
+        """Score whole documents, splitting them into windows when they are too long for the model.
+        
+        For a text that fits in one window this is exactly the pipeline's own
+        label and score. In cascade mode each result also names its tier.
+        """
+        with timer('overall_sentiment'):
+            if self.cascade_threshold is None:
+                return [self._sentiment_from_weights(*weights) for weights in self._window_weights(texts)]
+            weights, tiers = self._cascade_weights(texts, lexicon)
+            return [
+                dict(self._sentiment_from_weights(*text_weights), tier=tier)
+                for text_weights, tier in zip(weights, tiers)
+            ]
+
+    def _score_sentences(self, sentence_texts):
+        """Label/score pairs, batched through the transformer when available.
+        
+        In cascade mode only the sentences the first tier isn't sure about
+        reach the transformer, and each pair records its 'tier'.
+        """
+        if not self.sentiment_pipeline:
+            with timer('model_inference'):
+                return [textblob_sentiment(sent_text) for sent_text in sentence_texts]
+        if self.cascade_threshold is None:
+            return self._classify(sentence_texts)
+        
+        decisions = self._first_tier(sentence_texts)
+        escalated = [i for i, positive in enumerate(decisions) if positive is None]
+        results = [None] * len(sentence_texts)
+        for i, positive in enumerate(decisions):
+            if positive is not None:
+                results[i] = {
+                    'label': 'POSITIVE' if positive >= 0.5 else 'NEGATIVE',
+                    'score': max(positive, 1 - positive),
+                    'tier': 'lexicon'
                 }
-            
-            # Prepare final emotions output with metadata
-            emotions_with_metadata = {}
-            for emotion, score in emotions.items():
-                metadata = self.emotion_metadata.get(emotion, {})
-                emotions_with_metadata[emotion] = {
-                    'score': score,
-                    'symbol': metadata.get('symbol', '❓'),
-                    'description': metadata.get('description', 'No description available')
+        for i, output in zip(escalated, self._classify([sentence_texts[i] for i in escalated])):
+            results[i] = dict(output, tier='transformer')
+        
+        CASCADE_DECISIONS.inc(len(sentence_texts) - len(escalated), level='sentence', tier='lexicon')
+        CASCADE_DECISIONS.inc(len(escalated), level='sentence', tier='transformer')
+        return results
+
+    def _sentence_sentiments(self, sentence_texts):
+        """Label/score pairs for each sentence, scoring each unique sentence once.
+        
+        Sentences are keyed by their normalized text. Repeats within the call
+        (which covers every document of a batch group) are scored once and
+        fanned out, and repeats across calls come from the sentence cache.
+        With near-duplicate detection on, a long sentence that differs only
+        slightly from a recent one reuses that one's score.
+        """
+        keys = [normalize_text(sent_text) for sent_text in sentence_texts]
+        first_index = {}
+        for i, key in enumerate(keys):
+            first_index.setdefault(key, i)
+        
+        sentiments = {}
+        aliases = {}
+        to_score = []
+        scheduled = set()
+        near = 0
+        for key in first_index:
+            cached = self.sentence_cache.get(key)
+            if cached is not None:
+                sentiments[key] = cached
+                continue
+            if self.near_duplicates is not None:
+                match = self.near_duplicates.match(key)
+                if match is not None:
+                    if match in sentiments or match in scheduled:
+                        # Already found or being scored in this call
+                        aliases[key] = match
+                        near += 1
+                        continue
+                    match_sentiment = self.sentence_cache.get(match)
+                    if match_sentiment is not None:
+                        sentiments[key] = match_sentiment
+                        near += 1
+                        continue
+            to_score.append(key)
+            scheduled.add(key)
+        
+        if to_score:
+            for key, sentiment in zip(to_score, self._score_sentences([sentence_texts[first_index[key]] for key in to_score])):
+                sentiments[key] = sentiment
+                # First-tier scores are cheap to redo and depend on the lexicon version; only cache model scores
+                if sentiment.get('tier') != 'lexicon':
+                    self.sentence_cache.put(key, sentiment)
+        for key, match in aliases.items():
+            sentiments[key] = sentiments[match]
+        
+        with self._dedup_lock:
+            self.dedup_stats['sentences'] += len(keys)
+            self.dedup_stats['exact_duplicates'] += len(keys) - len(first_index)
+            self.dedup_stats['near_duplicates'] += near
+            self.dedup_stats['cached'] += len(first_index) - len(to_score) - near
+            self.dedup_stats['scored'] += len(to_score)
+        return [sentiments[key] for key in keys]
+
+    def _new_emotion_totals(self, lexicon):
+        return {
+            'emotions': np.zeros(len(lexicon.engine.emotions)),
+            'total': 0.0
+        }
+
+    def _emotion_documents(self, texts, docs=None):
+        """Token lists for the emotion engine: one per sentence of each parsed doc.
+        
+        Without docs (no parse planned), each text is tokenized only and
+        scored as a single sentence. That is enough to tell whether a text
+        has emotional content for the neutral check, at a fraction of the
+        cost of a parse.
+        """
+        if docs is not None:
+            return [sentence_tokens(doc) for doc in docs]
+        return [[[token.lower_ for token in tokens]] for tokens in self.nlp.tokenizer.pipe(texts)]
+
+    def _accumulate_emotions(self, documents, totals, lexicon):
+        """Add the raw lexicon emotion scores of several documents (chunks of one document) to totals."""
+        with timer('lexicon_scoring'):
+            scores, content = lexicon.engine.raw_scores(documents)
+        totals['emotions'] += scores.sum(axis=0)
+        totals['total'] += float(content.sum())
+        return totals
+
+    def _finalize_emotions(self, totals, lexicon):
+        """Normalize accumulated emotion scores and drop the weak ones."""
+        with timer('lexicon_scoring'):
+            return lexicon.engine.normalize(totals['emotions'], [totals['total']])[0]
+
+    def _sentence_analysis(self, sentence_texts):
+        with timer('sentence_analysis'):
+            analysis = []
+            for sent_text, sent_sentiment in zip(sentence_texts, self._sentence_sentiments(sentence_texts)):
+                item = {
+                    'text': sent_text,
+                    'sentiment': sent_sentiment['label'],
+                    'confidence': sent_sentiment['score']
                 }
-            
-            # Extract key phrases (nouns and noun phrases)
-            key_phrases = []
-            for chunk in self.nlp(text).noun_chunks:
+                if 'tier' in sent_sentiment:
+                    item['tier'] = sent_sentiment['tier']
+                analysis.append(item)
+            return analysis
+
+    def _emotions_with_metadata(self, emotions, lexicon):
+        emotions_with_metadata = {}
+        for emotion, score in emotions.items():
+            metadata = lexicon.metadata.get(emotion, {})
+            emotions_with_metadata[emotion] = {
+                'score': score,
+                'symbol': metadata.get('symbol', '❓'),
+                'description': metadata.get('description', 'No description available')
+            }
+        return emotions_with_metadata
+
+    def _key_phrases(self, doc):
+        """Extract key phrases (nouns and noun phrases)."""
+        key_phrases = []
+        with timer('key_phrases'):
+            for chunk in doc.noun_chunks:
                 if chunk.root.pos_ in ['NOUN', 'PROPN']:
                     key_phrases.append(chunk.text)
+        return key_phrases
+
+    def phrase_keys(self, phrases):
+        """Aggregation keys for key phrases: lowercased lemmas without determiners and pronouns.
+        
+        'The new phones' and 'my new phone' both become 'new phone'. Used by
+        phrases.PhraseAggregator; without a lemmatizer the phrases are only
+        normalized.
+        """
+        keys = [self.phrase_key_cache.get(phrase) for phrase in phrases]
+        missing = list(dict.fromkeys(phrase for phrase, key in zip(phrases, keys) if key is None))
+        if not missing:
+            return keys
+        
+        if 'lemmatizer' in self.nlp.component_names:
+            lemmatizer = self.nlp.get_pipe('lemmatizer')
+            # Phrases are tagged on their own, which is enough to lemmatize a noun chunk
+            docs = lemmatizer.pipe(self.nlp.pipe(missing, disable=['parser']))
+            computed = {
+                phrase: normalize_phrase(' '.join(
+                    token.lemma_ for token in doc if token.pos_ not in PHRASE_KEY_SKIP_POS
+                ))
+                for phrase, doc in zip(missing, docs)
+            }
+        else:
+            computed = {phrase: normalize_phrase(phrase) for phrase in missing}
+        for phrase, key in computed.items():
+            self.phrase_key_cache.put(phrase, key)
+        return [computed[phrase] if key is None else key for phrase, key in zip(phrases, keys)]
+
+    def _plan(self, fields):
+        """Which stages the fields need: (overall sentiment, spaCy parse)."""
+        # The TextBlob fallback can label a text 'neutral', which the neutral check reads, so it always runs
+        needs_overall = 'sentiment' in fields or 'polarity' in fields or not self.sentiment_pipeline
+        needs_parse = any(field in fields for field in ('emotions', 'key_phrases', 'sentence_analysis'))
+        return needs_overall, needs_parse
+
+    def _analyze_group(self, texts, fields=FIELDS, lexicon=None):
+        """Analyze a group of non-empty, stripped texts together.
+        
+        spaCy parses the group with nlp.pipe and the transformer sees the
+        windows and sentences of every document in shared batches. Stages
+        whose output isn't in fields don't run: without 'sentence_analysis'
+        there is no per-sentence transformer pass, without 'key_phrases' no
+        noun chunks, and with neither nor 'emotions' no parse at all. Lexicon
+        scoring always runs, on tokens alone if nothing was parsed, because
+        the neutral check depends on it.
+        """
+        lexicon = lexicon or self._lexicon
+        needs_overall, needs_parse = self._plan(fields)
+        if needs_overall:
+            overall_sentiments = self._overall_sentiments(texts, lexicon)
+        else:
+            # Not returned, and with the transformer the neutral check never matches on it
+            overall_sentiments = [{'sentiment': None, 'polarity': 0.0}] * len(texts)
+        
+        docs = None
+        if needs_parse:
+            with timer('spacy_parse'):
+                docs = list(self.nlp.pipe(texts, batch_size=self.batch_size))
+        
+        # Lexicon emotions for every document in the group in one vectorized call
+        with timer('lexicon_scoring'):
+            all_emotions = lexicon.engine.score(self._emotion_documents(texts, docs))
+        
+        results = [None] * len(texts)
+        pending = []
+        for index, (overall_sentiment, emotions) in enumerate(zip(overall_sentiments, all_emotions)):
+            # If no significant emotions were found or sentiment is neutral, return neutral
+            if not emotions or (overall_sentiment['sentiment'] == 'neutral' and overall_sentiment['polarity'] < 0.2):
+                results[index] = neutral_result(overall_sentiment['polarity'])
+                if 'tier' in overall_sentiment:
+                    results[index]['tier'] = overall_sentiment['tier']
+                continue
             
-            # Prepare sentence-level analysis
-            sentence_analysis = []
-            for sent in sentences:
-                sent_doc = self.nlp(sent.text)
-                sent_blob = TextBlob(sent.text)
-                
-                # Get sentence-level sentiment
-                sent_sentiment = self.sentiment_pipeline(sent.text)[0] if self.sentiment_pipeline else {
-                    'label': 'positive' if sent_blob.sentiment.polarity > 0 else 'negative' if sent_blob.sentiment.polarity < 0 else 'neutral',
-                    'score': (sent_blob.sentiment.polarity + 1) / 2
-                }
-                
-                sentence_analysis.append({
-                    'text': sent.text,
-                    'sentiment': sent_sentiment['label'],
-                    'confidence': sent_sentiment['score']
-                })
+            results[index] = {
+                'sentiment': overall_sentiment['sentiment'],
+                'polarity': overall_sentiment['polarity'],
+                'emotions': self._emotions_with_metadata(emotions, lexicon),
+                'key_phrases': self._key_phrases(docs[index]) if 'key_phrases' in fields else [],
+                'sentence_analysis': []
+            }
+            if 'tier' in overall_sentiment:
+                results[index]['tier'] = overall_sentiment['tier']
+            if 'sentence_analysis' in fields:
+                pending.append((index, [sent.text for sent in docs[index].sents]))
+        
+        # Prepare sentence-level analysis, scoring the sentences of all documents in shared batches
+        if pending:
+            sentence_texts = [sent_text for _, sentence_group in pending for sent_text in sentence_group]
+            sentence_analysis = iter(self._sentence_analysis(sentence_texts))
+            for index, sentence_group in pending:
+                results[index]['sentence_analysis'] = [next(sentence_analysis) for _ in sentence_group]
+        
+        return [select_fields(result, fields) for result in results]
+
+    def analyze(self, text, fields=FIELDS):
+        """Analyze the sentiment and emotions of the given text.
+        
+        fields (see resolve_fields()) limits the result, and the work done,
+        to the named fields.
+        """
+        return next(self.analyze_batch([text], fields=fields))
+
+    def analyze_batch(self, texts, group_size=16, fields=FIELDS):
+        """Analyze many texts, yielding one result per text in input order.
+        
+        texts may be any iterable, including a generator reading a stream.
+        Texts are processed group_size at a time, so results for the first
+        group are available before later texts have been read.
+        """
+        group = []
+        for text in texts:
+            group.append(text)
+            if len(group) >= group_size:
+                yield from self._analyze_texts(group, fields)
+                group = []
+        if group:
+            yield from self._analyze_texts(group, fields)
+
+    def _cache_variant(self, lexicon, fields=FIELDS):
+        """Result cache key variant: the lexicon version and near-duplicate reuse, plus the fields of a subset."""
+        variant = lexicon.version
+        if self.near_duplicates is not None:
+            # Reused near-duplicate scores are approximate; exact runs must not be served them
+            variant += f"+near{self.near_duplicates.threshold:g}"
+        if fields == FIELDS:
+            return variant
+        return f"{variant}:{','.join(fields)}"
+
+    def _cached(self, text, fields, lexicon):
+        """A cached result for text with these fields, cut down from a cached full result if need be."""
+        result = self.cache.get(text, self._cache_variant(lexicon, fields))
+        if result is None and fields != FIELDS:
+            full = self.cache.get(text, self._cache_variant(lexicon))
+            if full is not None:
+                result = select_fields(full, fields)
+        return result
+
+    def _analyze_texts(self, texts, fields=FIELDS):
+        # Every text in the group is analyzed, and cached, with the same lexicon version
+        lexicon = self._lexicon
+        results = [None] * len(texts)
+        indices = []
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                results[i] = select_fields(empty_result(), fields)
+            elif self.cache:
+                results[i] = self._cached(text, fields, lexicon)
+            if results[i] is None:
+                indices.append(i)
+        if not indices:
+            return results
+        
+        try:
+            # Preprocess text
+            analyzed = self._analyze_group([texts[i].strip() for i in indices], fields, lexicon)
+        except Exception as e:
+            logger.exception("Error in sentiment analysis: %s", e)
+            ERRORS.inc(stage='analysis')
+            analyzed = [select_fields(neutral_result(0.0), fields) for _ in indices]
+        else:
+            if self.cache:
+                variant = self._cache_variant(lexicon, fields)
+                for i, result in zip(indices, analyzed):
+                    self.cache.put(texts[i], result, variant)
+        
+        for i, result in zip(indices, analyzed):
+            results[i] = result
+        return results
+
+    def analyze_events(self, chunks, group_size=16, fields=FIELDS, lexicon=None):
+        """Analyze one document supplied as chunks, yielding (event, data) as each stage finishes.
+        
+        Chunks are pages or paragraphs, e.g. straight from an upload stream.
+        They are parsed and scored a group at a time, and only running totals
+        are kept between groups, so the document is never concatenated and
+        the first events don't wait for the whole document. Sentences don't
+        span chunk boundaries. Events, in order:
+        
+        - 'sentiment': provisional overall sentiment after the first group
+        - 'sentences': sentence-level results, one event per scored batch
+        - 'sentiment': final overall sentiment
+        - 'emotions', 'key_phrases'
+        - 'done': the complete result, shaped like analyze()'s
+        
+        Sentences are streamed before the final neutral check, so a neutral
+        document still sends its sentences even though the 'done' result,
+        like analyze(), carries none. Events for fields left out of fields
+        are not sent, and their stages don't run.
+        """
+        lexicon = lexicon or self._lexicon
+        needs_overall, needs_parse = self._plan(fields)
+        overall_weights = [0.0, 0.0]
+        # In cascade mode the document is decided by the lexicon tier only if every chunk was
+        escalated = False
+        emotion_totals = self._new_emotion_totals(lexicon)
+        key_phrases = []
+        sentence_analysis = []
+        seen_text = False
+        
+        group = []
+        chunks = (chunk.strip() for chunk in chunks if chunk and chunk.strip())
+        for chunk in itertools.chain(chunks, [None]):
+            if chunk is not None:
+                group.append(chunk)
+                if len(group) < group_size:
+                    continue
+            if not group:
+                break
             
-            return {
+            if needs_overall:
+                with timer('overall_sentiment'):
+                    if self.cascade_threshold is None:
+                        weights = self._window_weights(group)
+                    else:
+                        weights, tiers = self._cascade_weights(group, lexicon)
+                        escalated = escalated or 'transformer' in tiers
+                for total, weighted in weights:
+                    overall_weights[0] += total
+                    overall_weights[1] += weighted
+            if not seen_text:
+                if 'sentiment' in fields or 'polarity' in fields:
+                    yield 'sentiment', dict(self._sentiment_from_weights(*overall_weights), partial=True)
+                seen_text = True
+            
+            docs = None
+            if needs_parse:
+                with timer('spacy_parse'):
+                    docs = list(self.nlp.pipe(group, batch_size=self.batch_size))
+            self._accumulate_emotions(self._emotion_documents(group, docs), emotion_totals, lexicon)
+            sentence_texts = []
+            for doc in docs or []:
+                if 'key_phrases' in fields:
+                    key_phrases.extend(self._key_phrases(doc))
+                if 'sentence_analysis' in fields:
+                    sentence_texts.extend(sent.text for sent in doc.sents)
+            for start in range(0, len(sentence_texts), self.batch_size):
+                batch = self._sentence_analysis(sentence_texts[start:start + self.batch_size])
+                sentence_analysis.extend(batch)
+                yield 'sentences', batch
+            group = []
+        
+        if not seen_text:
+            yield 'done', select_fields(empty_result(), fields)
+            return
+        
+        if needs_overall:
+            overall_sentiment = self._sentiment_from_weights(*overall_weights)
+            if self.cascade_threshold is not None:
+                overall_sentiment['tier'] = 'transformer' if escalated else 'lexicon'
+        else:
+            overall_sentiment = {'sentiment': None, 'polarity': 0.0}
+        emotions = self._finalize_emotions(emotion_totals, lexicon)
+        
+        # If no significant emotions were found or sentiment is neutral, return neutral
+        if not emotions or (overall_sentiment['sentiment'] == 'neutral' and overall_sentiment['polarity'] < 0.2):
+            result = neutral_result(overall_sentiment['polarity'])
+        else:
+            result = {
                 'sentiment': overall_sentiment['sentiment'],
                 'polarity': overall_sentiment['polarity'],
-                'emotions': emotions_with_metadata,
+                'emotions': self._emotions_with_metadata(emotions, lexicon),
                 'key_phrases': key_phrases,
                 'sentence_analysis': sentence_analysis
             }
-            
+        if 'tier' in overall_sentiment:
+            result['tier'] = overall_sentiment['tier']
+        
+        if 'sentiment' in fields or 'polarity' in fields:
+            final = {'sentiment': result['sentiment'], 'polarity': result['polarity'], 'partial': False}
+            if 'tier' in result:
+                final['tier'] = result['tier']
+            yield 'sentiment', final
+        if 'emotions' in fields:
+            yield 'emotions', result['emotions']
+        if 'key_phrases' in fields:
+            yield 'key_phrases', result['key_phrases']
+        yield 'done', select_fields(result, fields)
+
+    def _result_events(self, result, fields=FIELDS, sentences=True):
+        """The analyze_events() events for a finished result, e.g. one from the cache."""
+        if 'sentiment' in fields or 'polarity' in fields:
+            final = {'sentiment': result.get('sentiment'), 'polarity': result.get('polarity'), 'partial': False}
+            if 'tier' in result:
+                final['tier'] = result['tier']
+            yield 'sentiment', final
+        if sentences and result.get('sentence_analysis'):
+            yield 'sentences', result['sentence_analysis']
+        if 'emotions' in fields:
+            yield 'emotions', result['emotions']
+        if 'key_phrases' in fields:
+            yield 'key_phrases', result['key_phrases']
+        yield 'done', result
+
+    def analyze_text_events(self, text, group_size=16, fields=FIELDS):
+        """analyze_events() for one text already in memory, ending in exactly analyze()'s result.
+        
+        The result cache is read and filled as by analyze(); a cached result
+        is replayed as events. A single paragraph is analyzed as one chunk.
+        Longer text is streamed group_size paragraphs at a time: a
+        provisional sentiment from the first group, then sentence batches
+        for each group. The final events and 'done' come from analyzing the
+        whole text as analyze() does, so they match it exactly; its
+        sentences may differ from the streamed ones where the parser joins
+        sentences across a paragraph break.
+        """
+        lexicon = self._lexicon
+        if not text or not text.strip():
+            yield 'done', select_fields(empty_result(), fields)
+            return
+        if self.cache:
+            cached = self._cached(text, fields, lexicon)
+            if cached is not None:
+                yield from self._result_events(cached, fields)
+                return
+        
+        paragraphs = [paragraph.strip() for paragraph in PARAGRAPH_BREAK.split(text) if paragraph.strip()]
+        if len(paragraphs) == 1:
+            for event, data in self.analyze_events([text], fields=fields, lexicon=lexicon):
+                if event == 'done' and self.cache:
+                    self.cache.put(text, data, self._cache_variant(lexicon, fields))
+                yield event, data
+            return
+        
+        for start in range(0, len(paragraphs), group_size):
+            group = paragraphs[start:start + group_size]
+            if start == 0 and ('sentiment' in fields or 'polarity' in fields):
+                with timer('overall_sentiment'):
+                    if self.cascade_threshold is None:
+                        weights = self._window_weights(group)
+                    else:
+                        weights, _ = self._cascade_weights(group, lexicon)
+                total_weight = sum(total for total, _ in weights)
+                positive_weight = sum(positive for _, positive in weights)
+                yield 'sentiment', dict(self._sentiment_from_weights(total_weight, positive_weight), partial=True)
+            if 'sentence_analysis' in fields:
+                with timer('spacy_parse'):
+                    docs = list(self.nlp.pipe(group, batch_size=self.batch_size))
+                sentence_texts = [sent.text for doc in docs for sent in doc.sents]
+                # Scored sentences go into the sentence cache, so the whole-text pass below reuses them
+                for batch_start in range(0, len(sentence_texts), self.batch_size):
+                    yield 'sentences', self._sentence_analysis(sentence_texts[batch_start:batch_start + self.batch_size])
+        
+        # The final result, cached, exactly as analyze() computes it
+        result = self._analyze_texts([text], fields)[0]
+        yield from self._result_events(result, fields, sentences=False)
+
+    def analyze_chunks(self, chunks, group_size=16, fields=FIELDS):
+        """Analyze one document supplied as an iterable of text chunks.
+        
+        Same result as analyze() on the joined text, except that sentences
+        don't span chunk boundaries. Errors raised while reading chunks
+        propagate to the caller; analysis errors give a neutral result.
+        """
+        try:
+            for event, data in self.analyze_events(_guard_source(chunks), group_size, fields):
+                if event == 'done':
+                    return data
+        except ChunkSourceError as e:
+            raise e.__cause__
         except Exception as e:
-            print(f"Error in sentiment analysis: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return {
-                'sentiment': 'neutral',
-                'polarity': 0.0,
-                'emotions': {'neutral': {'score': 1.0, 'symbol': '😐', 'description': 'No strong emotions detected'}},
-                'key_phrases': [],
-                'sentence_analysis': []
-            }
+            logger.exception("Error in sentiment analysis: %s", e)
+            ERRORS.inc(stage='analysis')
+            return select_fields(neutral_result(0.0), fields)
 
     def analyze_file(self, file_content):
         """Analyze the sentiment of a file's content."""
@@ -1,5 +1,6 @@
 let emotionChart = null;
 let lastAnalysisResult = null;
+let lastResultId = null;
 
 document.addEventListener('DOMContentLoaded', function() {
     // Add Chart.js script dynamically and wait for it to load
@@ -157,38 +158,30 @@ document.addEventListener('DOMContentLoaded', function() {
         buttonText.textContent = 'Analyzing...';
         
         try {
-            let response;
+            let options;
             
             if (fileInput.files.length > 0) {
                 const formData = new FormData();
                 formData.append('file', fileInput.files[0]);
-                response = await fetch('/analyze', {
-                    method: 'POST',
-                    body: formData
-                });
+                options = { body: formData };
             } else {
                 const text = textInput.value.trim();
                 if (!text) {
                     throw new Error('Please enter some text to analyze');
                 }
-                response = await fetch('/analyze', {
-                    method: 'POST',
+                options = {
                     headers: {
                         'Content-Type': 'application/json',
                     },
                     body: JSON.stringify({ text: text })
-                });
+                };
             }
 
-            const data = await response.json();
-            
-            if (!response.ok) {
-                throw new Error(data.error || 'Failed to analyze text');
-            }
+            // Results are rendered progressively as the stream arrives
+            const data = await streamAnalysis(options);
 
             lastAnalysisResult = data;
-            displayResults(data);
-            resultsSection.classList.add('visible');
+            lastResultId = data.result_id || null;
             
         } catch (error) {
             console.error('Error:', error);
@@ -200,98 +193,107 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
     // Export button handlers
-    exportCSVButton.addEventListener('click', async function() {
-        if (!lastAnalysisResult) {
-            alert('Please analyze some text before exporting');
-            return;
-        }
-        
-        try {
-            const response = await fetch('/export/csv', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(lastAnalysisResult)
-            });
-            
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.error || 'Failed to export CSV');
-            }
-            
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.style.display = 'none';
-            a.href = url;
-            
-            // Get filename from Content-Disposition header or use default
-            const contentDisposition = response.headers.get('Content-Disposition');
-            const filenameMatch = contentDisposition && contentDisposition.match(/filename="(.+)"/);
-            a.download = filenameMatch ? filenameMatch[1] : `sentiment_analysis_${new Date().toISOString().slice(0,19).replace(/[:]/g, '')}.csv`;
-            
-            document.body.appendChild(a);
-            a.click();
-            document.body.removeChild(a);
-            window.URL.revokeObjectURL(url);
-        } catch (error) {
-            console.error('Error:', error);
-            alert(error.message || 'Failed to export CSV');
-        }
+    exportCSVButton.addEventListener('click', function() {
+        downloadExport('csv', 'CSV');
     });
 
-    exportPDFButton.addEventListener('click', async function() {
-        if (!lastAnalysisResult) {
-            alert('Please analyze some text before exporting to PDF');
-            return;
+    exportPDFButton.addEventListener('click', function() {
+        downloadExport('pdf', 'PDF');
+    });
+});
+
+async function fetchExport(format) {
+    // The server keeps recent results, so normally only the ID goes over the wire
+    if (lastResultId) {
+        const response = await fetch(`/export/${format}/${encodeURIComponent(lastResultId)}`);
+        if (response.status !== 404) {
+            return response;
         }
+        // Expired on the server: fall back to sending the result itself
+        lastResultId = null;
+    }
+    return fetch(`/export/${format}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(lastAnalysisResult)
+    });
+}
+
+async function downloadExport(format, label) {
+    if (!lastAnalysisResult) {
+        alert(`Please analyze some text before exporting to ${label}`);
+        return;
+    }
+    
+    try {
+        const response = await fetchExport(format);
         
-        try {
-            const response = await fetch('/export/pdf', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(lastAnalysisResult)
-            });
-            
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.error || 'Failed to export PDF');
-            }
-            
-            const blob = await response.blob();
-            const url = window.URL.createObjectURL(blob);
-            const a = document.createElement('a');
-            a.style.display = 'none';
-            a.href = url;
-            const contentDisposition = response.headers.get('Content-Disposition');
-            const filenameMatch = contentDisposition && contentDisposition.match(/filename="(.+)"/);
-            a.download = filenameMatch ? filenameMatch[1] : 'sentiment_analysis.pdf';
-            document.body.appendChild(a);
-            a.click();
-            document.body.removeChild(a);
-            window.URL.revokeObjectURL(url);
-        } catch (error) {
-            console.error('Error:', error);
-            alert(error.message || 'Failed to export PDF');
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.error || `Failed to export ${label}`);
         }
-    });
-});
+        
+        const blob = await response.blob();
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.style.display = 'none';
+        a.href = url;
+        
+        // Get filename from Content-Disposition header or use default
+        const contentDisposition = response.headers.get('Content-Disposition');
+        const filenameMatch = contentDisposition && contentDisposition.match(/filename="?([^";]+)"?/);
+        a.download = filenameMatch ? filenameMatch[1] : `sentiment_analysis_${new Date().toISOString().slice(0,19).replace(/[:]/g, '')}.${format}`;
+        
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
+        window.URL.revokeObjectURL(url);
+    } catch (error) {
+        console.error('Error:', error);
+        alert(error.message || `Failed to export ${label}`);
+    }
+}
 
 function displayResults(data) {
-    const resultsSection = document.getElementById('results');
-    const sentimentResult = document.getElementById('sentimentResult');
-    const emotionContainer = document.getElementById('emotionDistribution');
-    const keyPhrasesContainer = document.getElementById('keyPhrases');
-    const sentenceAnalysisContainer = document.getElementById('sentenceAnalysis');
+    renderSentiment(data);
+    renderEmotions(data.emotions);
+    renderKeyPhrases(data.key_phrases);
+    renderSentences(data.sentence_analysis);
+    showResults();
+}
 
-    if (!resultsSection || !sentimentResult || !emotionContainer || !keyPhrasesContainer || !sentenceAnalysisContainer) {
+function showResults() {
+    const resultsSection = document.getElementById('results');
+    if (!resultsSection) {
         console.error('Required results elements not found');
         return;
     }
 
+    // Show export buttons
+    const exportButtons = document.getElementById('exportButtons');
+    if (exportButtons) {
+        exportButtons.classList.remove('d-none');
+    }
+    
+    // Make results visible
+    resultsSection.classList.add('visible');
+}
+
+function clearResults() {
+    ['sentimentResult', 'keyPhrases', 'sentenceAnalysis'].forEach(id => {
+        const container = document.getElementById(id);
+        if (container) container.innerHTML = '';
+    });
+    const emotionCards = document.querySelector('#emotionDistribution .emotion-cards');
+    if (emotionCards) emotionCards.innerHTML = '';
+}
+
+function renderSentiment(data) {
+    const sentimentResult = document.getElementById('sentimentResult');
+    if (!sentimentResult) return;
+
     // Update sentiment section
     const sentimentClass = getSentimentClass(data.polarity);
     sentimentResult.innerHTML = `
@@ -304,13 +306,17 @@ function displayResults(data) {
             <p class="confidence-value">Confidence: ${(data.polarity * 100).toFixed(1)}%</p>
         </div>
     `;
+}
+
+function renderEmotions(emotions) {
+    const emotionContainer = document.getElementById('emotionDistribution');
+    if (!emotionContainer) return;
 
     // Update emotion distribution
     const emotionCards = emotionContainer.querySelector('.emotion-cards');
     emotionCards.innerHTML = ''; // Clear existing cards
 
     // Check if we're in a neutral state (all emotions near 0)
-    const emotions = data.emotions;
     const isNeutral = Object.values(emotions).every(emotion => emotion.score < 0.1);
 
     if (isNeutral) {
@@ -381,10 +387,15 @@ function displayResults(data) {
         }));
         updateEmotionChart(chartData);
     }
+}
+
+function renderKeyPhrases(keyPhrases) {
+    const keyPhrasesContainer = document.getElementById('keyPhrases');
+    if (!keyPhrasesContainer) return;
 
     // Update key phrases
-    if (data.key_phrases && data.key_phrases.length > 0) {
-        const phrasesList = data.key_phrases
+    if (keyPhrases && keyPhrases.length > 0) {
+        const phrasesList = keyPhrases
             .map(phrase => `<span class="badge bg-secondary me-2 mb-2">${phrase}</span>`)
             .join('');
         keyPhrasesContainer.innerHTML = `
@@ -394,39 +405,121 @@ function displayResults(data) {
     } else {
         keyPhrasesContainer.innerHTML = '';
     }
+}
 
-    // Update sentence analysis
-    if (data.sentence_analysis && data.sentence_analysis.length > 0) {
-        const sentencesList = data.sentence_analysis
-            .map(sentence => `
-                <div class="sentence-item ${getSentimentClass(sentence.confidence)}">
-                    <p class="sentence-text">${sentence.text}</p>
-                    <div class="sentence-metadata">
-                        <span class="sentiment-label">${sentence.sentiment}</span>
-                        <div class="confidence-bar">
-                            <div class="confidence-fill" 
-                                 style="width: ${sentence.confidence * 100}%"></div>
-                        </div>
+function renderSentenceItems(sentences) {
+    return sentences
+        .map(sentence => `
+            <div class="sentence-item ${getSentimentClass(sentence.confidence)}">
+                <p class="sentence-text">${sentence.text}</p>
+                <div class="sentence-metadata">
+                    <span class="sentiment-label">${sentence.sentiment}</span>
+                    <div class="confidence-bar">
+                        <div class="confidence-fill" 
+                             style="width: ${sentence.confidence * 100}%"></div>
                     </div>
                 </div>
-            `)
-            .join('');
+            </div>
+        `)
+        .join('');
+}
+
+function renderSentences(sentences) {
+    const sentenceAnalysisContainer = document.getElementById('sentenceAnalysis');
+    if (!sentenceAnalysisContainer) return;
+
+    // Update sentence analysis
+    if (sentences && sentences.length > 0) {
         sentenceAnalysisContainer.innerHTML = `
             <h3>Sentence Analysis</h3>
-            <div class="sentences-list">${sentencesList}</div>
+            <div class="sentences-list">${renderSentenceItems(sentences)}</div>
         `;
     } else {
         sentenceAnalysisContainer.innerHTML = '';
     }
+}
+
+function appendSentences(sentences) {
+    const sentenceAnalysisContainer = document.getElementById('sentenceAnalysis');
+    if (!sentenceAnalysisContainer || !sentences.length) return;
+
+    let list = sentenceAnalysisContainer.querySelector('.sentences-list');
+    if (!list) {
+        sentenceAnalysisContainer.innerHTML = '<h3>Sentence Analysis</h3><div class="sentences-list"></div>';
+        list = sentenceAnalysisContainer.querySelector('.sentences-list');
+    }
+    list.insertAdjacentHTML('beforeend', renderSentenceItems(sentences));
+}
 
-    // Show export buttons
-    const exportButtons = document.getElementById('exportButtons');
-    if (exportButtons) {
-        exportButtons.classList.remove('d-none');
+async function streamAnalysis(options) {
+    // Render each stage of /analyze/stream as its Server-Sent Event arrives
+    const response = await fetch('/analyze/stream', { method: 'POST', ...options });
+    if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.error || 'Failed to analyze text');
     }
-    
-    // Make results visible
-    resultsSection.classList.add('visible');
+
+    const result = { sentence_analysis: [] };
+    clearResults();
+
+    const handlers = {
+        sentiment(data) {
+            result.sentiment = data.sentiment;
+            result.polarity = data.polarity;
+            renderSentiment(result);
+            document.getElementById('results').classList.add('visible');
+        },
+        sentences(data) {
+            result.sentence_analysis.push(...data);
+            appendSentences(data);
+        },
+        emotions(data) {
+            result.emotions = data;
+            renderEmotions(data);
+        },
+        key_phrases(data) {
+            result.key_phrases = data;
+            renderKeyPhrases(data);
+        },
+        done(data) {
+            // Sent only when the final sentences differ from the streamed ones (e.g. none for a neutral result)
+            if (Array.isArray(data.sentence_analysis)) {
+                result.sentence_analysis = data.sentence_analysis;
+                renderSentences(result.sentence_analysis);
+            }
+            Object.assign(result, data, { sentence_analysis: result.sentence_analysis });
+            showResults();
+        },
+        error(data) {
+            throw new Error(data.error || 'Failed to analyze text');
+        }
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            const dataLines = [];
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+            });
+            if (handlers[event] && dataLines.length) {
+                handlers[event](JSON.parse(dataLines.join('\n')));
+            }
+        }
+    }
+    return result;
 }
 
 function getSentimentClass(polarity) {
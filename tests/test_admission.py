@@ -0,0 +1,105 @@
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from admission import AdmissionController, Rejected
+from asgi import BoundedExecutor, Overloaded
+
+
+class ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def test_timed_out_job_keeps_its_lane_slot():
+    admission = AdmissionController(large_cost=100, large_concurrency=1, large_queue=0, max_wait=0.1)
+    executor = BoundedExecutor(workers=2, queue_size=0)
+    lane = admission.lane_for(1000)
+    finish = threading.Event()
+    
+    ticket = admission.acquire(1000)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(executor.run(ConnectedRequest(), finish.wait, timeout=0.1, ticket=ticket))
+    
+    # The job is still running in its thread, so the large lane is still full
+    assert lane.active == 1
+    with pytest.raises(Rejected):
+        admission.acquire(1000)
+    
+    finish.set()
+    deadline = time.monotonic() + 5
+    while lane.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert lane.active == 0
+    assert executor.in_use == 0
+
+
+def test_overloaded_executor_releases_the_ticket():
+    admission = AdmissionController(large_cost=100, large_concurrency=1, large_queue=0, max_wait=0.1)
+    executor = BoundedExecutor(workers=1, queue_size=0)
+    executor.in_use = executor.capacity
+    
+    ticket = admission.acquire(1000)
+    with pytest.raises(Overloaded):
+        asyncio.run(executor.run(ConnectedRequest(), time.sleep, 0, ticket=ticket))
+    
+    assert admission.lane_for(1000).active == 0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import app
+    ready = threading.Event()
+    ready.set()
+    monkeypatch.setattr(app, 'analyzer_ready', ready)
+    monkeypatch.setattr(app, 'admission', AdmissionController(large_cost=100, large_concurrency=1, large_queue=0, max_wait=0.1))
+    monkeypatch.setitem(app.app.config, 'MAX_CONTENT_LENGTH', 64 * 1024)
+    return app.app.test_client(), app.admission
+
+
+def test_oversized_stream_upload_releases_its_slot(client):
+    client, admission = client
+    body = b'a' * (128 * 1024)
+    response = client.post('/analyze/stream', data=body, content_type='multipart/form-data; boundary=x')
+    
+    assert response.status_code == 413
+    assert admission.lane_for(len(body)).active == 0
+
+
+def test_oversized_chunked_batch_releases_its_slot(client):
+    client, admission = client
+    # No Content-Length, so the body is admitted to the large lane and only fails once read
+    body = io.BytesIO(b'"' + b'a' * (128 * 1024) + b'"\n')
+    response = client.post(
+        '/analyze/batch',
+        input_stream=body,
+        content_type='application/x-ndjson',
+        headers={'Transfer-Encoding': 'chunked'},
+        environ_overrides={'wsgi.input_terminated': True}
+    )
+    
+    assert response.status_code == 413
+    assert admission.lanes['large'].active == 0
+
+
+def test_lane_waits_do_not_use_the_default_executor(monkeypatch):
+    import asgi
+    monkeypatch.setattr(asgi.flask_app, 'admission', AdmissionController(large_cost=100, max_wait=1))
+    monkeypatch.setattr(asgi, 'executor', BoundedExecutor(workers=1, queue_size=0))
+    blocked = threading.Event()
+    
+    async def admit_while_default_executor_is_busy():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+        busy = loop.run_in_executor(None, blocked.wait, 5)
+        try:
+            return await asyncio.wait_for(asgi._admitted(ConnectedRequest(), 10, len, 'text'), timeout=2)
+        finally:
+            blocked.set()
+            await busy
+    
+    assert asyncio.run(admit_while_default_executor_is_busy()) == 4
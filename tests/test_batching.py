@@ -0,0 +1,55 @@
+import threading
+import time
+
+from batching import MicroBatcher
+
+
+class RecordingBackend:
+    tokenizer = None
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, texts, batch_size=None, truncation=True):
+        self.batches.append(list(texts))
+        time.sleep(self.delay)
+        return [{'label': 'POSITIVE', 'score': len(text)} for text in texts]
+
+
+def test_lone_call_does_not_wait_for_the_batch_to_fill():
+    backend = RecordingBackend()
+    batcher = MicroBatcher(backend, max_batch_size=32, max_wait_ms=500)
+    texts = [f'text {i}' for i in range(20)]
+    
+    for _ in range(3):
+        start = time.monotonic()
+        outputs = batcher(texts)
+        assert time.monotonic() - start < 0.25
+    
+    assert [output['score'] for output in outputs] == [len(text) for text in texts]
+    assert backend.batches == [texts] * 3
+
+
+def test_concurrent_calls_share_batches_without_splitting_a_call():
+    backend = RecordingBackend(delay=0.05)
+    batcher = MicroBatcher(backend, max_batch_size=10, max_wait_ms=20)
+    results = {}
+    
+    def call(caller):
+        texts = [f'{caller}-{i}' for i in range(4)]
+        results[caller] = batcher(texts)
+    
+    threads = [threading.Thread(target=call, args=(caller,)) for caller in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert all(len(batch) <= 10 for batch in backend.batches)
+    assert len(backend.batches) < 6
+    for batch in backend.batches:
+        callers = {text.split('-')[0] for text in batch}
+        assert len(batch) == 4 * len(callers)
+    for caller, outputs in results.items():
+        assert [output['score'] for output in outputs] == [len(f'{caller}-{i}') for i in range(4)]
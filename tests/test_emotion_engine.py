@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from emotion_engine import EmotionEngine
+from lexicon import LexiconIndex, compile_index
+from sentiment_model import OPPOSITE_EMOTIONS
+
+# Single words only, as the original per-word lookup knew nothing of phrases. 'happy' is in two
+# emotions, 'so' is both an intensifier and a diminisher, and love's opposite isn't an emotion here
+EMOTION_WORDS = {
+    'joy': ['happy', 'glad', 'delighted'],
+    'sadness': ['sad', 'blue', 'gloomy'],
+    'anger': ['mad', 'angry'],
+    'serenity': ['calm', 'peaceful'],
+    'trust': ['reliable'],
+    'love': ['love', 'happy']
+}
+MODIFIERS = {'intensifiers': ['very', 'really', 'so'], 'diminishers': ['slightly', 'somewhat', 'so']}
+CONTEXT = {'negations': ['not', 'never', "n't"], 'temporal': ['now']}
+FILLER = ['the', 'a', 'it', 'was', 'today', 'and']
+
+
+def per_word_scores(sentences):
+    """The emotion scoring loop EmotionEngine replaced, for one document of token lists."""
+    emotions = {emotion: 0.0 for emotion in EMOTION_WORDS}
+    total_emotional_content = 0.0
+    for tokens in sentences:
+        negated = False
+        intensity = 1.0
+        for word in tokens:
+            if word in CONTEXT['negations']:
+                negated = not negated
+            if word in MODIFIERS['intensifiers']:
+                intensity *= 1.5
+            elif word in MODIFIERS['diminishers']:
+                intensity *= 0.5
+        for emotion, words in EMOTION_WORDS.items():
+            found = [word for word in tokens if word in words]
+            if found:
+                base_score = len(found) * intensity
+                if negated:
+                    base_score *= -0.5
+                    # The old loop raised KeyError for opposites outside the emotion list; the engine skips them
+                    if OPPOSITE_EMOTIONS.get(emotion) in emotions:
+                        emotions[OPPOSITE_EMOTIONS[emotion]] += abs(base_score) * 0.7
+                emotions[emotion] += abs(base_score)
+                total_emotional_content += abs(base_score)
+    if total_emotional_content > 0:
+        emotions = {k: v / total_emotional_content for k, v in emotions.items()}
+        emotions = {k: v for k, v in emotions.items() if v > 0.1}
+        total = sum(emotions.values())
+        if total > 0:
+            emotions = {k: v / total for k, v in emotions.items()}
+    return emotions
+
+
+@pytest.fixture(scope='module')
+def engine(tmp_path_factory):
+    sources = {
+        'emotion_words': EMOTION_WORDS,
+        'emotion_metadata': {emotion: {} for emotion in EMOTION_WORDS},
+        'emotion_modifiers': MODIFIERS,
+        'context_modifiers': CONTEXT
+    }
+    index = LexiconIndex(compile_index(sources, 'test', str(tmp_path_factory.mktemp('lexicon'))))
+    return EmotionEngine(index, OPPOSITE_EMOTIONS)
+
+
+def test_matches_per_word_scoring_on_random_documents(engine):
+    vocabulary = sorted({word for group in (EMOTION_WORDS, MODIFIERS, CONTEXT) for words in group.values() for word in words})
+    vocabulary += FILLER
+    rng = random.Random(1234)
+    documents = [
+        [[rng.choice(vocabulary) for _ in range(rng.randint(0, 10))] for _ in range(rng.randint(0, 6))]
+        for _ in range(500)
+    ]
+    
+    for document, scores in zip(documents, engine.score(documents)):
+        expected = per_word_scores(document)
+        assert scores.keys() == expected.keys(), document
+        for emotion, score in expected.items():
+            assert scores[emotion] == pytest.approx(score), document
+
+
+def test_chunks_add_up_to_the_whole_document(engine):
+    document = [['very', 'happy'], ['not', 'calm'], ['sad', 'and', 'mad']]
+    scores, totals = engine.raw_scores([document[:1], document[1:]])
+    
+    assert engine.normalize(scores.sum(axis=0), totals.sum()) == engine.score([document])
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from lexicon import LexiconIndex, compile_index, prune_index, read_sources
+from sentiment_model import LEXICON_DIR
+
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    version, sources = read_sources(LEXICON_DIR)
+    return LexiconIndex(compile_index(sources, version, str(tmp_path_factory.mktemp('lexicon'))))
+
+
+def matched(index, sentence):
+    tokens = sentence.split()
+    return [(' '.join(tokens[start:end]), index.labels(term_id)) for start, end, term_id in index.match(tokens)]
+
+
+def test_phrase_replaces_the_words_inside_it(index):
+    assert matched(index, 'it came out of the blue') == [('out of the blue', {('emotion', 'surprise')})]
+    assert matched(index, 'true love') == [('true love', {('emotion', 'love')})]
+
+
+def test_single_words_still_match_outside_phrases(index):
+    assert matched(index, 'i feel blue but true') == [
+        ('blue', {('emotion', 'sadness')}),
+        ('true', {('emotion', 'trust')})
+    ]
+
+
+def test_overlapping_phrases_match_leftmost_first(tmp_path):
+    sources = {
+        'emotion_words': {'joy': ['a b', 'b c d', 'c', 'd']},
+        'emotion_metadata': {'joy': {}},
+        'emotion_modifiers': {},
+        'context_modifiers': {}
+    }
+    index = LexiconIndex(compile_index(sources, 'test', str(tmp_path)))
+    
+    assert [phrase for phrase, _ in matched(index, 'a b c d')] == ['a b', 'c', 'd']
+    assert [phrase for phrase, _ in matched(index, 'x b c d c')] == ['b c d', 'c']
+
+
+def test_prune_keeps_current_and_recent_versions(tmp_path):
+    version, sources = read_sources(LEXICON_DIR)
+    for i, name in enumerate(['v1', 'v2', 'v3', 'v4']):
+        path = compile_index(sources, name, str(tmp_path))
+        os.utime(path, (i, i))
+    (tmp_path / '.v5-building').mkdir()
+    
+    prune_index(str(tmp_path), 'v1', keep=2)
+    
+    assert sorted(os.listdir(tmp_path)) == ['.v5-building', 'v1', 'v3', 'v4']
@@ -0,0 +1,55 @@
+from phrases import PhraseAggregator, SpaceSaving
+
+
+def emotions(**scores):
+    return {name: {'score': score, 'symbol': '', 'description': ''} for name, score in scores.items()}
+
+
+def test_zero_score_emotions_are_not_counted():
+    stats = PhraseAggregator(capacity=10)
+    stats.add({
+        'sentiment': 'POSITIVE',
+        'key_phrases': ['the battery life'],
+        'emotions': emotions(joy=0.0, anger=0.0, fear=0.0)
+    })
+    
+    assert stats.top(sentiment='positive') == [{'phrase': 'battery life', 'documents': 1, 'error': 0}]
+    assert stats.top(emotion='anger') == []
+    assert stats.by_emotion == {}
+
+
+def test_phrases_count_under_expressed_emotions_only():
+    stats = PhraseAggregator(capacity=10)
+    stats.add({
+        'sentiment': 'NEGATIVE',
+        'key_phrases': ['The delivery', 'the delivery'],
+        'emotions': emotions(anger=0.6, joy=0.0, neutral=0.4)
+    })
+    
+    assert stats.top(emotion='anger') == [{'phrase': 'delivery', 'documents': 1, 'error': 0}]
+    assert set(stats.by_emotion) == {'anger'}
+
+
+def test_sentiment_labels_are_matched_in_any_case():
+    stats = PhraseAggregator(capacity=10)
+    stats.add({'sentiment': 'NEGATIVE', 'key_phrases': ['the screen']})
+    stats.add({'sentiment': 'negative', 'key_phrases': ['the screen']})
+    
+    expected = [{'phrase': 'screen', 'documents': 2, 'error': 0}]
+    assert stats.top(sentiment='negative') == expected
+    assert stats.top(sentiment='NEGATIVE') == expected
+    assert list(stats.summary()['by_sentiment']) == ['negative']
+
+
+def test_space_saving_bounds_counts():
+    sketch = SpaceSaving(capacity=3)
+    stream = ['a'] * 10 + ['b'] * 5 + ['c', 'd', 'e', 'f'] + ['a'] * 3
+    for key in stream:
+        sketch.add(key)
+    
+    assert len(sketch) == 3
+    counts = {key: (count, error) for key, count, error in sketch.top(3)}
+    assert counts['a'] == (13, 0)
+    for key, (count, error) in counts.items():
+        true_count = stream.count(key)
+        assert true_count <= count <= true_count + error
@@ -0,0 +1,52 @@
+import re
+from types import SimpleNamespace
+
+from sentiment_model import SentimentAnalyzer
+
+
+class WhitespaceTokenizer:
+    """One token per run of non-space characters, with a 14-token window."""
+    model_max_length = 16
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False):
+        offsets = [match.span() for match in re.finditer(r'\S+', text)]
+        return {'input_ids': list(range(len(offsets))), 'offset_mapping': offsets}
+
+
+def make_analyzer(window_overlap=64):
+    analyzer = SentimentAnalyzer.__new__(SentimentAnalyzer)
+    analyzer.sentiment_pipeline = SimpleNamespace(tokenizer=WhitespaceTokenizer())
+    analyzer.window_overlap = window_overlap
+    return analyzer
+
+
+def test_windows_cover_dense_text_with_overlap():
+    text = ' '.join(f'w{i}' for i in range(100))
+    windows = list(make_analyzer()._windows(text))
+    
+    assert all(count <= 14 for _, count in windows)
+    assert windows[0][0].startswith('w0 ')
+    assert windows[-1][0].endswith('w99')
+    # Neighbours share the overlap (7 tokens for a 14-token window)
+    assert windows[1][0].split()[:7] == windows[0][0].split()[-7:]
+
+
+def test_windows_continue_after_long_blank_gap():
+    text = 'good ' * 20 + ' ' * 1000 + 'bad ' * 20
+    windows = list(make_analyzer()._windows(text))
+    
+    assert any('bad' in window for window, _ in windows)
+    assert windows[-1][0].endswith('bad')
+
+
+def test_sparse_segments_are_not_rescored_token_by_token():
+    # About three tokens per segment, so each segment has fewer tokens than the overlap
+    text = ''.join(f'w{i}' + ' ' * 40 for i in range(60))
+    windows = list(make_analyzer()._windows(text))
+    words = [word for window, _ in windows for word in window.split()]
+    
+    assert sum(count for _, count in windows) == 60
+    assert words == [f'w{i}' for i in range(60)]